@@ -16,6 +16,7 @@ class Settings(BaseSettings):
     app_name: str = "Couple Chat AI"
     debug: bool = False
     environment: Literal["development", "production"] = "development"
+    log_level: str = "INFO"
     
     # Server
     host: str = "0.0.0.0"
@@ -25,6 +26,12 @@ class Settings(BaseSettings):
     supabase_url: str = Field(..., description="Supabase project URL")
     supabase_key: str = Field(..., description="Supabase anon/service key")
     supabase_storage_bucket: str = "media"
+    supabase_max_connections: int = 20
+    supabase_max_keepalive: int = 10
+    
+    # Redis (optional response cache and cross-worker WebSocket relay)
+    redis_url: str = ""  # e.g. redis://localhost:6379/0, empty disables caching
+    redis_max_connections: int = 20
     
     # Encryption
     encryption_key: str = Field(..., description="32-byte AES encryption key (base64 encoded)")
@@ -57,6 +64,8 @@ class Settings(BaseSettings):
     # Embedding Model
     embedding_model: str = "BAAI/bge-small-en-v1.5"
     embedding_dimension: int = 384
+    embedding_backend: Literal["onnx", "torch"] = "onnx"  # falls back to torch if ONNX Runtime is missing
+    embedding_onnx_file: str = "onnx/model_qint8_avx512_vnni.onnx"  # quantized export; empty for fp32 onnx/model.onnx
     
     # LLM Configuration - OpenRouter (cloud) or Local
     openrouter_api_key: str = ""  # Get from https://openrouter.ai/keys
@@ -3,6 +3,9 @@
 from core.encryption import EncryptionService, get_encryption_service, generate_encryption_key
 from core.security import SecurityService, security_service, ContentCategory, FileValidationError
 from core.supabase_client import SupabaseClient, get_supabase_client, supabase
+from core.cache import RedisCache, cache, cached, etagged
+from core.http_client import HttpClientHolder, http_client, create_http_client
+from core.request_scope import RequestScopeMiddleware, request_scope
 
 __all__ = [
     "EncryptionService",
@@ -15,4 +18,13 @@ __all__ = [
     "SupabaseClient",
     "get_supabase_client",
     "supabase",
+    "RedisCache",
+    "cache",
+    "cached",
+    "etagged",
+    "HttpClientHolder",
+    "http_client",
+    "create_http_client",
+    "RequestScopeMiddleware",
+    "request_scope",
 ]
@@ -0,0 +1,380 @@
+"""
+Redis cache module for response caching.
+Provides an async Redis wrapper and a caching decorator for read endpoints.
+"""
+
+import time
+import asyncio
+import hashlib
+import inspect
+import functools
+from typing import Any, Awaitable, Callable, Optional, Set
+
+import orjson
+from fastapi import HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
+
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+from config import settings
+
+
+# Cache expiry policies (seconds)
+CACHE_SHORT = 5
+CACHE_NORMAL = 15
+CACHE_LONG = 30
+
+# How long a last-known-good snapshot is kept for outage fallback
+STALE_TTL = 3600
+
+
+class RedisCache:
+    """
+    Async Redis wrapper backed by a shared connection pool.
+    All operations are no-ops when Redis is not configured or unreachable.
+    """
+    
+    def __init__(self):
+        """Initialize an unconnected cache."""
+        self._pool = None
+        self._client = None
+        self._connected = False
+        # Keys with a background revalidation in progress
+        self._refreshing: Set[str] = set()
+        self._refresh_tasks: Set[asyncio.Task] = set()
+    
+    @property
+    def is_connected(self) -> bool:
+        return self._connected
+    
+    @property
+    def client(self):
+        """Get the raw Redis client."""
+        if not self._connected:
+            raise RuntimeError("Redis not connected. Check REDIS_URL in .env")
+        return self._client
+    
+    async def connect(self) -> None:
+        """Create the connection pool and verify the server is reachable."""
+        if not settings.redis_url:
+            print("ℹ️ REDIS_URL not set - response caching disabled")
+            return
+        
+        if not REDIS_AVAILABLE:
+            print("⚠️ redis package not installed. Install with: pip install redis")
+            return
+        
+        try:
+            self._pool = aioredis.ConnectionPool.from_url(
+                settings.redis_url,
+                max_connections=settings.redis_max_connections
+            )
+            self._client = aioredis.Redis(connection_pool=self._pool)
+            await self._client.ping()
+            self._connected = True
+            print("✅ Redis connected successfully")
+        except Exception as e:
+            print(f"⚠️ Redis connection failed: {e}")
+            print("Running without response cache")
+            await self.disconnect()
+    
+    async def disconnect(self) -> None:
+        """Close the client and release pooled connections."""
+        if self._client is not None:
+            await self._client.aclose()
+        if self._pool is not None:
+            await self._pool.disconnect()
+        self._client = None
+        self._pool = None
+        self._connected = False
+    
+    async def get(self, key: str) -> Optional[Any]:
+        """
+        Get a cached JSON value.
+        
+        Args:
+            key: Cache key
+            
+        Returns:
+            Decoded value, or None on miss or error
+        """
+        if not self._connected:
+            return None
+        
+        try:
+            raw = await self._client.get(key)
+        except Exception:
+            return None
+        
+        return orjson.loads(raw) if raw is not None else None
+    
+    async def set(self, key: str, value: Any, expire: int) -> None:
+        """
+        Store a JSON-serializable value.
+        
+        Args:
+            key: Cache key
+            value: Value to store
+            expire: Time to live in seconds
+        """
+        if not self._connected:
+            return
+        
+        try:
+            await self._client.set(key, orjson.dumps(value), ex=expire)
+        except Exception:
+            pass
+    
+    async def set_snapshot(self, key: str, value: Any, fresh_for: int, keep_for: int) -> None:
+        """
+        Store a last-known-good snapshot as a hash with freshness timestamps.
+        
+        Args:
+            key: Snapshot key
+            value: JSON-serializable body
+            fresh_for: Seconds until the body is considered stale
+            keep_for: Seconds to keep the snapshot at all
+        """
+        if not self._connected:
+            return
+        
+        now = time.time()
+        try:
+            async with self._client.pipeline(transaction=False) as pipe:
+                pipe.hset(key, mapping={
+                    "generated_at": now,
+                    "stale_at": now + fresh_for,
+                    "body": orjson.dumps(value),
+                })
+                pipe.expire(key, keep_for)
+                await pipe.execute()
+        except Exception:
+            pass
+    
+    async def get_snapshot(self, key: str) -> Optional[Any]:
+        """
+        Get the body of a snapshot written by set_snapshot.
+        
+        Args:
+            key: Snapshot key
+            
+        Returns:
+            Decoded body, or None if absent or on error
+        """
+        if not self._connected:
+            return None
+        
+        try:
+            body = await self._client.hget(key, "body")
+        except Exception:
+            return None
+        
+        return orjson.loads(body) if body is not None else None
+    
+    async def swr(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: int,
+        stale: int
+    ) -> Any:
+        """
+        Get a value with stale-while-revalidate semantics.
+        
+        Values younger than ttl are returned as-is. Values between ttl and
+        stale seconds old are returned immediately while a background task
+        reloads them. Older or missing values are loaded inline.
+        
+        Args:
+            key: Cache key
+            loader: Coroutine factory producing a JSON-serializable value
+            ttl: Seconds a value is fresh
+            stale: Seconds a value may be served while revalidating
+            
+        Returns:
+            Cached or freshly loaded value
+        """
+        if not self._connected:
+            return await loader()
+        
+        entry = await self.get(key)
+        if entry is not None:
+            age = time.time() - entry["generated_at"]
+            if age < ttl:
+                return entry["value"]
+            if age < stale:
+                self._schedule_refresh(key, loader, stale)
+                return entry["value"]
+        
+        return await self._refresh(key, loader, stale)
+    
+    async def _refresh(self, key: str, loader: Callable[[], Awaitable[Any]], stale: int) -> Any:
+        """Load a value and store it with its generation time."""
+        value = await loader()
+        await self.set(key, {"generated_at": time.time(), "value": value}, stale)
+        return value
+    
+    def _schedule_refresh(self, key: str, loader: Callable[[], Awaitable[Any]], stale: int) -> None:
+        """Revalidate a key in the background, at most once at a time."""
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        
+        async def run():
+            try:
+                await self._refresh(key, loader, stale)
+            except Exception as e:
+                print(f"⚠️ Cache refresh failed for {key}: {e}")
+            finally:
+                self._refreshing.discard(key)
+        
+        task = asyncio.create_task(run())
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
+    
+    async def delete(self, *keys: str) -> None:
+        """Delete one or more keys."""
+        if not self._connected or not keys:
+            return
+        
+        try:
+            await self._client.delete(*keys)
+        except Exception:
+            pass
+    
+    async def delete_pattern(self, pattern: str) -> int:
+        """
+        Delete all keys matching a glob pattern.
+        
+        Args:
+            pattern: Redis glob pattern, e.g. "room:1:*"
+            
+        Returns:
+            Number of keys deleted
+        """
+        if not self._connected:
+            return 0
+        
+        try:
+            keys = [key async for key in self._client.scan_iter(match=pattern, count=100)]
+            if keys:
+                await self._client.delete(*keys)
+            return len(keys)
+        except Exception:
+            return 0
+
+
+# Singleton instance
+cache = RedisCache()
+
+
+def cache_key(prefix: str, resource_id: Any, endpoint: str) -> str:
+    """
+    Key under which @cached stores an endpoint's response.
+    
+    Args:
+        prefix: Key namespace, e.g. "room"
+        resource_id: Value of the endpoint's key_param
+        endpoint: Endpoint function name
+        
+    Returns:
+        Cache key; its stale snapshot lives at "<key>:stale"
+    """
+    return f"{prefix}:{resource_id}:{endpoint}"
+
+
+def cached(
+    prefix: str,
+    expire: int,
+    key_param: str = "room_id",
+    stale_fallback: bool = False
+) -> Callable:
+    """
+    Cache an endpoint's JSON response in Redis.
+    
+    The key is "{prefix}:{<key_param value>}:{endpoint name}", so all
+    entries for one resource can be invalidated with "{prefix}:{id}:*".
+    
+    With stale_fallback, each fresh response also refreshes a ":stale"
+    snapshot kept for STALE_TTL. If the endpoint later fails with an
+    unexpected error, that snapshot is served with "X-Cache: STALE"
+    instead of a 500.
+    
+    Args:
+        prefix: Key namespace, e.g. "room"
+        expire: Time to live in seconds
+        key_param: Endpoint keyword argument identifying the resource
+        stale_fallback: Serve the last known snapshot on failure
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = cache_key(prefix, kwargs[key_param], func.__name__)
+            
+            hit = await cache.get(key)
+            if hit is not None:
+                return hit
+            
+            try:
+                result = await func(*args, **kwargs)
+            except HTTPException:
+                raise
+            except Exception:
+                if not stale_fallback:
+                    raise
+                stale = await cache.get_snapshot(f"{key}:stale")
+                if stale is None:
+                    raise
+                return ORJSONResponse(content=stale, headers={"X-Cache": "STALE"})
+            
+            body = jsonable_encoder(result)
+            await cache.set(key, body, expire)
+            if stale_fallback:
+                await cache.set_snapshot(f"{key}:stale", body, expire, STALE_TTL)
+            return result
+        
+        return wrapper
+    return decorator
+
+
+def etagged(max_age: int = 5) -> Callable:
+    """
+    Add ETag / 304 Not Modified support to a JSON GET endpoint.
+    
+    The ETag is a blake2b digest of the serialized body. When the client's
+    If-None-Match matches, an empty 304 is returned instead of the body.
+    Apply above @cached so cache hits are tagged too.
+    
+    Args:
+        max_age: Seconds clients may reuse the response without revalidating
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, request: Request, **kwargs):
+            result = await func(*args, **kwargs)
+            if isinstance(result, Response):
+                # e.g. a stale fallback; pass through untagged
+                return result
+            
+            body = orjson.dumps(jsonable_encoder(result))
+            etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+            headers = {"ETag": etag, "Cache-Control": f"private, max-age={max_age}"}
+            
+            if_none_match = request.headers.get("if-none-match", "")
+            if etag in (tag.strip() for tag in if_none_match.split(",")):
+                return Response(status_code=304, headers=headers)
+            return Response(content=body, media_type="application/json", headers=headers)
+        
+        # Expose the Request parameter to FastAPI without changing the endpoint
+        signature = inspect.signature(func)
+        wrapper.__signature__ = signature.replace(parameters=[
+            *signature.parameters.values(),
+            inspect.Parameter("request", inspect.Parameter.KEYWORD_ONLY, annotation=Request),
+        ])
+        return wrapper
+    return decorator
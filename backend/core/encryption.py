@@ -20,6 +20,7 @@ class EncryptionService:
     
     NONCE_SIZE = 12  # 96 bits recommended for GCM
     KEY_SIZE = 32    # 256 bits
+    MAGIC = b"\x00CCE1"  # Marks binary payloads; never starts base64 text
     
     def __init__(self, encryption_key: str):
         """
@@ -90,6 +91,44 @@ class EncryptionService:
         """
         return self._aesgcm.decrypt(nonce, ciphertext, associated_data)
     
+    def encrypt_to_bytes(self, plaintext: bytes, associated_data: bytes | None = None) -> bytes:
+        """
+        Encrypt data for binary storage with embedded nonce.
+        
+        Format: MAGIC + nonce + ciphertext (no base64, so no 4/3 size
+        inflation or extra full-size copies)
+        
+        Args:
+            plaintext: Data to encrypt
+            associated_data: Optional additional authenticated data
+            
+        Returns:
+            Bytes containing the format marker, nonce and ciphertext
+        """
+        nonce, ciphertext = self.encrypt(plaintext, associated_data)
+        return b"".join((self.MAGIC, nonce, ciphertext))
+    
+    def decrypt_from_bytes(self, encrypted_data: bytes, associated_data: bytes | None = None) -> bytes:
+        """
+        Decrypt stored data from encrypt_to_bytes.
+        
+        Data without the format marker is treated as legacy
+        encrypt_to_base64 output.
+        
+        Args:
+            encrypted_data: Stored bytes
+            associated_data: Optional additional authenticated data
+            
+        Returns:
+            Decrypted plaintext bytes
+        """
+        if not encrypted_data.startswith(self.MAGIC):
+            return self.decrypt_from_base64(encrypted_data.decode('utf-8'), associated_data)
+        
+        view = memoryview(encrypted_data)
+        nonce_end = len(self.MAGIC) + self.NONCE_SIZE
+        return self.decrypt(bytes(view[len(self.MAGIC):nonce_end]), view[nonce_end:], associated_data)
+    
     def encrypt_to_base64(self, plaintext: bytes, associated_data: bytes | None = None) -> str:
         """
         Encrypt data and return as base64 string with embedded nonce.
@@ -0,0 +1,71 @@
+"""
+Shared outbound HTTP client.
+One pooled httpx.AsyncClient is created for the app lifetime so TLS
+connections to LLM providers are reused across requests.
+"""
+
+from typing import Optional
+
+import httpx
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+# Pool limits for outbound API calls
+MAX_KEEPALIVE_CONNECTIONS = 32
+MAX_CONNECTIONS = 64
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Create a pooled async HTTP client.
+    
+    HTTP/2 is enabled when the h2 package is installed so concurrent
+    requests to the same host share one connection.
+    
+    Returns:
+        Configured httpx.AsyncClient
+    """
+    if not HTTP2_AVAILABLE:
+        print("⚠️ h2 package not installed - using HTTP/1.1. Install with: pip install httpx[http2]")
+    
+    return httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        timeout=httpx.Timeout(30.0, connect=5.0),
+        limits=httpx.Limits(
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            max_connections=MAX_CONNECTIONS
+        )
+    )
+
+
+class HttpClientHolder:
+    """Holds the app-wide HTTP client between startup and shutdown."""
+    
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+    
+    def open(self) -> httpx.AsyncClient:
+        """Create the shared client if it does not exist yet."""
+        if self._client is None:
+            self._client = create_http_client()
+        return self._client
+    
+    async def close(self) -> None:
+        """Close the shared client and its pooled connections."""
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = None
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Get the shared client, creating it lazily outside the app lifespan."""
+        return self.open()
+
+
+# Singleton instance
+http_client = HttpClientHolder()
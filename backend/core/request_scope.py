@@ -0,0 +1,40 @@
+"""
+Per-request memoization scope.
+A context variable holds a dict that lives for one HTTP request, so
+services can reuse lookups made earlier in the same request.
+"""
+
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+
+_request_scope: ContextVar[Optional[Dict[Any, Any]]] = ContextVar("request_scope", default=None)
+
+
+def request_scope() -> Optional[Dict[Any, Any]]:
+    """
+    Get the memo dict for the current request.
+    
+    Returns:
+        The request's dict, or None outside an HTTP request (e.g. in a
+        long-lived WebSocket handler, where memoized rows would go stale)
+    """
+    return _request_scope.get()
+
+
+class RequestScopeMiddleware:
+    """ASGI middleware that opens a fresh memo scope for every HTTP request."""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        token = _request_scope.set({})
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_scope.reset(token)
@@ -35,6 +35,14 @@ class SecurityService:
         "abuse", "illegal", "weapon", "harm"
     ]
     
+    # Leading bytes for supported image formats
+    IMAGE_MAGIC_BYTES = {
+        "image/jpeg": [b'\xff\xd8\xff'],
+        "image/png": [b'\x89PNG\r\n\x1a\n'],
+        "image/gif": [b'GIF87a', b'GIF89a'],
+        "image/webp": [b'RIFF'],
+    }
+    
     @staticmethod
     def generate_room_secret(length: int = 32) -> str:
         """
@@ -126,19 +134,28 @@ class SecurityService:
         Returns:
             True if magic bytes match
         """
-        magic_bytes = {
-            "image/jpeg": [b'\xff\xd8\xff'],
-            "image/png": [b'\x89PNG\r\n\x1a\n'],
-            "image/gif": [b'GIF87a', b'GIF89a'],
-            "image/webp": [b'RIFF'],
-        }
-        
-        expected = magic_bytes.get(content_type, [])
+        expected = SecurityService.IMAGE_MAGIC_BYTES.get(content_type, [])
         if not expected:
             return True  # Unknown type, skip validation
         
         return any(content.startswith(magic) for magic in expected)
     
+    @staticmethod
+    def detect_content_type(content: bytes) -> str:
+        """
+        Detect an image MIME type from its magic bytes.
+        
+        Args:
+            content: File content bytes
+            
+        Returns:
+            Detected MIME type, or application/octet-stream if unknown
+        """
+        for content_type, magics in SecurityService.IMAGE_MAGIC_BYTES.items():
+            if any(content.startswith(magic) for magic in magics):
+                return content_type
+        return "application/octet-stream"
+    
     @staticmethod
     def check_content_safety(text: str) -> ContentCategory:
         """
@@ -5,9 +5,12 @@ Provides async-compatible wrapper around Supabase Python client.
 
 from typing import Any, Optional
 from functools import lru_cache
+
+import httpx
 from supabase import create_client, Client
 
 from config import settings
+from core.http_client import HTTP2_AVAILABLE
 
 
 class SupabaseClient:
@@ -22,6 +25,7 @@ class SupabaseClient:
                 settings.supabase_url,
                 settings.supabase_key
             )
+            self._pool_postgrest_session()
             self._connected = True
             print("✅ Supabase connected successfully")
         except Exception as e:
@@ -30,6 +34,28 @@ class SupabaseClient:
             self._client = None
             self._connected = False
     
+    def _pool_postgrest_session(self) -> None:
+        """
+        Back all table queries with one process-wide pooled HTTP session.
+        
+        PostgREST's default session has a 120s timeout and default pool
+        limits; this keeps warm keep-alive connections within explicit
+        limits and fails fast on a dead connection.
+        """
+        postgrest = self._client.postgrest
+        default_session = postgrest.session
+        postgrest.session = httpx.Client(
+            base_url=default_session.base_url,
+            headers=default_session.headers,
+            http2=HTTP2_AVAILABLE,
+            timeout=httpx.Timeout(5.0, connect=2.0),
+            limits=httpx.Limits(
+                max_connections=settings.supabase_max_connections,
+                max_keepalive_connections=settings.supabase_max_keepalive
+            )
+        )
+        default_session.close()
+    
     @property
     def is_connected(self) -> bool:
         return self._connected
@@ -145,20 +171,41 @@ class SupabaseClient:
         result = query.execute()
         return result.data or []
     
-    async def upsert(self, table_name: str, data: dict) -> dict:
+    async def upsert(
+        self,
+        table_name: str,
+        data: dict,
+        on_conflict: str = ""
+    ) -> dict:
         """
         Insert or update a record.
         
         Args:
             table_name: Name of the table
-            data: Record data (must include primary key)
+            data: Record data
+            on_conflict: Comma-separated unique columns to merge on
+                (defaults to the primary key)
             
         Returns:
             Upserted record
         """
-        result = self._client.table(table_name).upsert(data).execute()
+        result = self._client.table(table_name).upsert(data, on_conflict=on_conflict).execute()
         return result.data[0] if result.data else {}
     
+    async def rpc(self, function_name: str, params: dict) -> Any:
+        """
+        Call a Postgres function.
+        
+        Args:
+            function_name: Name of the SQL function
+            params: Named arguments
+            
+        Returns:
+            Function result (a list of rows for set-returning functions)
+        """
+        result = self._client.rpc(function_name, params).execute()
+        return result.data
+    
     # ================== Storage Operations ==================
     
     def get_storage_bucket(self, bucket_name: Optional[str] = None):
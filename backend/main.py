@@ -11,6 +11,7 @@ A private two-person chat platform with:
 """
 
 import sys
+import logging
 from pathlib import Path
 
 # Add backend directory to path for imports
@@ -19,11 +20,20 @@ sys.path.insert(0, str(Path(__file__).parent))
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 import uvicorn
 
 from config import settings
+from core.cache import cache
+from core.http_client import http_client
+from core.request_scope import RequestScopeMiddleware
 from routes import rooms_router, chat_router, bot_router, memory_router
+from ws import connection_manager
+
+logging.basicConfig(
+    level=settings.log_level.upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+)
 
 
 @asynccontextmanager
@@ -39,12 +49,18 @@ async def lifespan(app: FastAPI):
     print(f"🧠 Embedding model: {settings.embedding_model}")
     chroma_info = "Cloud" if settings.chroma_cloud_enabled else f"Local ({settings.chroma_persist_directory})"
     print(f"💾 ChromaDB: {chroma_info}")
+    await cache.connect()
+    await connection_manager.start_relay()
+    app.state.http_client = http_client.open()
     print(f"✅ Server ready!")
     
     yield
     
     # Shutdown
     print(f"👋 Shutting down {settings.app_name}...")
+    await connection_manager.stop_relay()
+    await cache.disconnect()
+    await http_client.close()
 
 
 # Create FastAPI application
@@ -75,6 +91,7 @@ app = FastAPI(
     """,
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     docs_url="/docs",
     redoc_url="/redoc",
     openapi_url="/openapi.json"
@@ -94,12 +111,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-request memo scope (deduplicates repeated room lookups within a request)
+app.add_middleware(RequestScopeMiddleware)
+
 
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """Handle uncaught exceptions."""
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "error": "Internal server error",
@@ -3,6 +3,7 @@ Message models for chat messages, reactions, and memories.
 Handles text, media, bot responses, and vector memory storage.
 """
 
+import calendar
 from datetime import datetime
 from enum import Enum
 from typing import Optional, List, Dict, Any
@@ -102,7 +103,8 @@ class MessagePublic(BaseModel):
     @classmethod
     def from_message(cls, message: Message) -> "MessagePublic":
         """Create MessagePublic from Message model."""
-        return cls(
+        # Fields were validated when the Message was built; skip re-validation
+        return cls.model_construct(
             id=message.id,
             room_id=message.room_id,
             sender_id=message.sender_id,
@@ -153,6 +155,8 @@ class MemoryEntry(BaseModel):
             "category": self.category.value,
             "message_id": self.message_id or "",
             "timestamp": self.timestamp.isoformat(),
+            # Epoch nanoseconds (naive timestamps are UTC) for integer ordering
+            "ts_ns": calendar.timegm(self.timestamp.utctimetuple()) * 10**9 + self.timestamp.microsecond * 1000,
             **self.metadata
         }
 
@@ -3,6 +3,7 @@ User models for room participants.
 Handles user roles, sessions, and public profiles.
 """
 
+from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
 from typing import Optional
@@ -48,15 +49,16 @@ class UserPublic(BaseModel):
     last_seen: datetime
 
 
-class UserSession(BaseModel):
+@dataclass(frozen=True, slots=True)
+class UserSession:
     """
     WebSocket session information.
     Tracks active connections and user presence.
+    
+    Built server-side on every connect and never validated or serialized,
+    so a slotted dataclass rather than a Pydantic model.
     """
     user_id: str
     room_id: int
     device_id: str
     connected_at: datetime
-    
-    class Config:
-        from_attributes = True
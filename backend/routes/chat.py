@@ -3,13 +3,21 @@ Chat API routes and WebSocket endpoint.
 Handles real-time messaging, file uploads, and reactions.
 """
 
-import json
-from typing import Optional
+import re
+import asyncio
+import logging
+import base64
+import uuid
+from typing import List, Optional, AsyncIterator, Set, Tuple
 from datetime import datetime
 from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, UploadFile, File, Form, status
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
+import orjson
 
 from config import settings
+from core.cache import cache, cache_key
+from core.security import security_service
 from models.message import (
     MessageCreate, MessagePublic, MessageType, ReactionType,
     ReactionCreate, ReactionRemove, ChatHistory, WebSocketMessage
@@ -21,6 +29,17 @@ from ws.connection_manager import connection_manager
 
 
 router = APIRouter(prefix="/chat", tags=["chat"])
+logger = logging.getLogger(__name__)
+
+# Value -> member lookup tables for enums coerced on the WebSocket hot path
+_MSG_TYPES = {m.value: m for m in MessageType}
+_REACTION_TYPES = {r.value: r for r in ReactionType}
+
+# Anchored, case-insensitive "@bot" prefix check (avoids lowercasing the whole message)
+_BOT_MATCH = re.compile(r"^\s*@bot\b", re.IGNORECASE).match
+
+# Strong references to in-flight bot replies so they aren't garbage collected
+_bot_tasks: Set[asyncio.Task] = set()
 
 
 class SendMessageRequest(BaseModel):
@@ -39,12 +58,71 @@ class SendMessageResponse(BaseModel):
     bot_response: Optional[MessagePublic] = None
 
 
+async def _bot_reply(room_id: int, content: str, sender_id: str, reply_to_id: str) -> None:
+    """Generate, store, and broadcast a bot reply to a message."""
+    # Tokens are forwarded as they stream in; the final new_message carries
+    # the same stream_id so clients can replace the partial reply
+    stream_id = uuid.uuid4().hex
+    
+    async def forward_token(token: str) -> None:
+        await connection_manager.broadcast_event(
+            room_id,
+            "bot_token",
+            {"stream_id": stream_id, "token": token},
+            sender_id="bot"
+        )
+    
+    try:
+        bot_text = await bot_service.generate_response(
+            room_id,
+            content,
+            sender_id,
+            on_token=forward_token
+        )
+        
+        bot_message = await message_service.create_bot_message(
+            room_id=room_id,
+            content=bot_text,
+            reply_to_id=reply_to_id
+        )
+        
+        bot_public = MessagePublic.from_message(bot_message)
+        
+        await connection_manager.broadcast_to_room(
+            room_id,
+            WebSocketMessage(
+                event="new_message",
+                data={**bot_public.model_dump(), "stream_id": stream_id},
+                room_id=room_id,
+                sender_id="bot"
+            )
+        )
+    except Exception:
+        # Nobody awaits this task, so the traceback is only kept here
+        logger.exception("Bot reply failed for room %s", room_id)
+        # Let clients discard the partial reply streamed so far
+        await connection_manager.broadcast_event(
+            room_id,
+            "bot_error",
+            {"stream_id": stream_id},
+            sender_id="bot"
+        )
+
+
+def _schedule_bot_reply(room_id: int, content: str, sender_id: str, reply_to_id: str) -> None:
+    """Run a bot reply concurrently with the caller."""
+    task = asyncio.create_task(_bot_reply(room_id, content, sender_id, reply_to_id))
+    _bot_tasks.add(task)
+    task.add_done_callback(_bot_tasks.discard)
+
+
 @router.post("/send", response_model=SendMessageResponse)
 async def send_message(request: SendMessageRequest):
     """
     Send a text message to a room.
     
-    If mention_bot is True, the bot will respond.
+    If mention_bot is True, the bot will respond. The reply is generated
+    in the background and arrives as a new_message WebSocket event.
     """
     try:
         # Create message
@@ -70,37 +148,18 @@ async def send_message(request: SendMessageRequest):
             )
         )
         
-        # Generate bot response if mentioned
-        bot_response = None
+        # Bot response is generated in the background and delivered via WebSocket
         if request.mention_bot:
-            bot_text = await bot_service.generate_response(
+            _schedule_bot_reply(
                 request.room_id,
                 request.content,
-                request.sender_id
-            )
-            
-            bot_message = await message_service.create_bot_message(
-                room_id=request.room_id,
-                content=bot_text,
-                reply_to_id=message.id
-            )
-            
-            bot_response = MessagePublic.from_message(bot_message)
-            
-            # Broadcast bot response
-            await connection_manager.broadcast_to_room(
-                request.room_id,
-                WebSocketMessage(
-                    event="new_message",
-                    data=bot_response.model_dump(),
-                    room_id=request.room_id,
-                    sender_id="bot"
-                )
+                request.sender_id,
+                message.id
             )
         
         return SendMessageResponse(
             message=message_public,
-            bot_response=bot_response
+            bot_response=None
         )
         
     except Exception as e:
@@ -186,12 +245,15 @@ async def upload_media(
 
 
 @router.post("/view-once/{message_id}")
-async def view_once_message(message_id: str, viewer_id: str):
+async def view_once_message(message_id: str, viewer_id: str, binary: bool = False):
     """
     View a view-once message.
     
     The message is decrypted and immediately deleted after viewing.
     Only the recipient (not the sender) can view.
+    
+    With binary=true the raw media bytes are returned instead of a
+    base64 JSON payload.
     """
     try:
         content, result = await message_service.view_once_message(message_id, viewer_id)
@@ -202,10 +264,19 @@ async def view_once_message(message_id: str, viewer_id: str):
                 detail=result
             )
         
+        if binary:
+            return Response(
+                content=content,
+                media_type=security_service.detect_content_type(content),
+                headers={"X-View-Once": "consumed"}
+            )
+        
+        # Encode off the event loop; large images take tens of ms
+        encoded = await asyncio.to_thread(base64.b64encode, content)
+        
         # Return decrypted content
-        import base64
         return {
-            "content": base64.b64encode(content).decode('utf-8'),
+            "content": encoded.decode('ascii'),
             "viewed": True,
             "message": "This message has been deleted after viewing"
         }
@@ -219,7 +290,34 @@ async def view_once_message(message_id: str, viewer_id: str):
         )
 
 
-@router.get("/history/{room_id}", response_model=ChatHistory)
+async def _stream_history(
+    room_id: int,
+    limit: int,
+    before_timestamp: Optional[datetime],
+    first_page: List[MessagePublic],
+    after: Optional[Tuple[str, str]],
+    has_more: bool
+) -> AsyncIterator[bytes]:
+    """Encode a ChatHistory document incrementally as later pages are fetched."""
+    yield b'{"messages":['
+    
+    oldest_timestamp = first_page[0].created_at if first_page else None
+    yield b",".join(orjson.dumps(message.model_dump()) for message in first_page)
+    
+    if len(first_page) == message_service.HISTORY_PAGE_SIZE:
+        async for message in message_service.iter_room_messages(
+            room_id,
+            limit=limit - len(first_page),
+            before_timestamp=before_timestamp,
+            after=after
+        ):
+            yield b"," + orjson.dumps(message.model_dump())
+    
+    yield b'],"has_more":' + orjson.dumps(has_more)
+    yield b',"oldest_timestamp":' + orjson.dumps(oldest_timestamp) + b"}"
+
+
+@router.get("/history/{room_id}", responses={200: {"model": ChatHistory}})
 async def get_chat_history(
     room_id: int,
     limit: int = 50,
@@ -228,6 +326,10 @@ async def get_chat_history(
     """
     Get chat history for a room with pagination.
     
+    Pages up to HISTORY_PAGE_SIZE are a single query. Larger limits are
+    streamed page by page as they are read, with bounded memory; the first
+    page is fetched before responding so failures still return a 500.
+    
     Args:
         room_id: Room to get history for
         limit: Maximum messages to return (default 50)
@@ -238,19 +340,35 @@ async def get_chat_history(
         if before:
             before_timestamp = datetime.fromisoformat(before)
         
-        history = await message_service.get_room_messages(
+        if limit <= message_service.HISTORY_PAGE_SIZE:
+            return await message_service.get_room_messages(
+                room_id,
+                limit=limit,
+                before_timestamp=before_timestamp
+            )
+        
+        start, has_more = await message_service.get_history_window(
             room_id,
             limit=limit,
             before_timestamp=before_timestamp
         )
-        
-        return history
+        first_page, after = await message_service.get_history_page(
+            room_id,
+            message_service.HISTORY_PAGE_SIZE,
+            before_timestamp,
+            start=start
+        )
         
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
+    
+    return StreamingResponse(
+        _stream_history(room_id, limit, before_timestamp, first_page, after, has_more),
+        media_type="application/json"
+    )
 
 
 @router.post("/reaction")
@@ -268,19 +386,16 @@ async def add_reaction(reaction: ReactionCreate, user_id: str):
         )
         
         # Broadcast reaction update
-        await connection_manager.broadcast_to_room(
+        await connection_manager.broadcast_event(
             message.room_id,
-            WebSocketMessage(
-                event="reaction_added",
-                data={
-                    "message_id": reaction.message_id,
-                    "user_id": user_id,
-                    "reaction_type": reaction.reaction_type.value,
-                    "reactions": message.reactions
-                },
-                room_id=message.room_id,
-                sender_id=user_id
-            )
+            "reaction_added",
+            {
+                "message_id": reaction.message_id,
+                "user_id": user_id,
+                "reaction_type": reaction.reaction_type.value,
+                "reactions": message.reactions
+            },
+            sender_id=user_id
         )
         
         return {"success": True, "reactions": message.reactions}
@@ -305,19 +420,16 @@ async def remove_reaction(reaction: ReactionRemove, user_id: str):
         )
         
         # Broadcast reaction update
-        await connection_manager.broadcast_to_room(
+        await connection_manager.broadcast_event(
             message.room_id,
-            WebSocketMessage(
-                event="reaction_removed",
-                data={
-                    "message_id": reaction.message_id,
-                    "user_id": user_id,
-                    "reaction_type": reaction.reaction_type.value,
-                    "reactions": message.reactions
-                },
-                room_id=message.room_id,
-                sender_id=user_id
-            )
+            "reaction_removed",
+            {
+                "message_id": reaction.message_id,
+                "user_id": user_id,
+                "reaction_type": reaction.reaction_type.value,
+                "reactions": message.reactions
+            },
+            sender_id=user_id
         )
         
         return {"success": True, "reactions": message.reactions}
@@ -340,13 +452,10 @@ async def clear_chat_history(room_id: int):
         count = await message_service.delete_room_messages(room_id)
         
         # Notify room
-        await connection_manager.broadcast_to_room(
+        await connection_manager.broadcast_event(
             room_id,
-            WebSocketMessage(
-                event="history_cleared",
-                data={"room_id": room_id, "cleared_count": count},
-                room_id=room_id
-            )
+            "history_cleared",
+            {"room_id": room_id, "cleared_count": count}
         )
         
         return {
@@ -364,6 +473,14 @@ async def clear_chat_history(room_id: int):
 
 # ==================== WebSocket Endpoint ====================
 
+def _presence_keys(room_id: int) -> list[str]:
+    """Cached room reads that include users' online status."""
+    return [
+        cache_key("room", room_id, endpoint)
+        for endpoint in ("get_online_users", "get_room_users", "get_room")
+    ]
+
+
 @router.websocket("/ws/{room_id}/{user_id}")
 async def websocket_endpoint(
     websocket: WebSocket,
@@ -401,12 +518,13 @@ async def websocket_endpoint(
         
         # Update user online status
         await room_service.update_user_online_status(user_id, True)
+        await cache.delete(*_presence_keys(room_id))
         
         # Main message loop
         while True:
             try:
                 data = await websocket.receive_text()
-                event_data = json.loads(data)
+                event_data = orjson.loads(data)
                 
                 event_type = event_data.get("event")
                 payload = event_data.get("data", {})
@@ -414,7 +532,7 @@ async def websocket_endpoint(
                 if event_type == "message":
                     # Handle new message
                     content = payload.get("content", "")
-                    message_type = MessageType(payload.get("type", "text"))
+                    message_type = _MSG_TYPES.get(payload.get("type", "text"), MessageType.TEXT)
                     reply_to = payload.get("reply_to_id")
                     mention_bot = payload.get("mention_bot", False)
                     
@@ -441,30 +559,8 @@ async def websocket_endpoint(
                     )
                     
                     # Generate bot response if mentioned
-                    if mention_bot or content.lower().startswith("@bot"):
-                        bot_text = await bot_service.generate_response(
-                            room_id,
-                            content,
-                            user_id
-                        )
-                        
-                        bot_message = await message_service.create_bot_message(
-                            room_id=room_id,
-                            content=bot_text,
-                            reply_to_id=message.id
-                        )
-                        
-                        bot_public = MessagePublic.from_message(bot_message)
-                        
-                        await connection_manager.broadcast_to_room(
-                            room_id,
-                            WebSocketMessage(
-                                event="new_message",
-                                data=bot_public.model_dump(),
-                                room_id=room_id,
-                                sender_id="bot"
-                            )
-                        )
+                    if mention_bot or _BOT_MATCH(content):
+                        _schedule_bot_reply(room_id, content, user_id, message.id)
                 
                 elif event_type == "typing":
                     # Handle typing indicator
@@ -474,7 +570,10 @@ async def websocket_endpoint(
                 elif event_type == "reaction":
                     # Handle reaction
                     message_id = payload.get("message_id")
-                    reaction_type = ReactionType(payload.get("reaction_type"))
+                    reaction_type = _REACTION_TYPES.get(payload.get("reaction_type"))
+                    if reaction_type is None:
+                        # Unknown reaction, ignore
+                        continue
                     action = payload.get("action", "add")
                     
                     if action == "add":
@@ -488,22 +587,19 @@ async def websocket_endpoint(
                         )
                         event_name = "reaction_removed"
                     
-                    await connection_manager.broadcast_to_room(
+                    await connection_manager.broadcast_event(
                         room_id,
-                        WebSocketMessage(
-                            event=event_name,
-                            data={
-                                "message_id": message_id,
-                                "user_id": user_id,
-                                "reaction_type": reaction_type.value,
-                                "reactions": message.reactions
-                            },
-                            room_id=room_id,
-                            sender_id=user_id
-                        )
+                        event_name,
+                        {
+                            "message_id": message_id,
+                            "user_id": user_id,
+                            "reaction_type": reaction_type.value,
+                            "reactions": message.reactions
+                        },
+                        sender_id=user_id
                     )
                 
-            except json.JSONDecodeError:
+            except orjson.JSONDecodeError:
                 # Invalid JSON, ignore
                 continue
                 
@@ -512,6 +608,7 @@ async def websocket_endpoint(
         session = await connection_manager.disconnect(websocket)
         if session:
             await room_service.update_user_online_status(session.user_id, False)
+            await cache.delete(*_presence_keys(session.room_id))
     
     except Exception as e:
         # Handle other errors
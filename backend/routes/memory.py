@@ -8,9 +8,9 @@ from fastapi import APIRouter, HTTPException, status
 from pydantic import BaseModel
 
 from models.message import (
-    MemoryCategory, MemoryEntry, MemorySearchResult, 
-    RememberRequest, WebSocketMessage
+    MemoryCategory, MemoryEntry, MemorySearchResult, RememberRequest
 )
+from services.bot_service import bot_service
 from services.memory_service import memory_service
 from services.message_service import message_service
 from ws.connection_manager import connection_manager
@@ -88,19 +88,16 @@ async def remember_message(request: RememberRequest, user_id: str):
         )
         
         # Notify room
-        await connection_manager.broadcast_to_room(
+        await connection_manager.broadcast_event(
             message.room_id,
-            WebSocketMessage(
-                event="message_remembered",
-                data={
-                    "message_id": request.message_id,
-                    "memory_id": memory.id,
-                    "category": request.category.value,
-                    "remembered_by": user_id
-                },
-                room_id=message.room_id,
-                sender_id=user_id
-            )
+            "message_remembered",
+            {
+                "message_id": request.message_id,
+                "memory_id": memory.id,
+                "category": request.category.value,
+                "remembered_by": user_id
+            },
+            sender_id=user_id
         )
         
         return RememberResponse(
@@ -259,15 +256,13 @@ async def clear_room_memories(room_id: int):
     """
     try:
         count = await memory_service.clear_room_memories(room_id)
+        await bot_service.clear_room_state(room_id)
         
         # Notify room
-        await connection_manager.broadcast_to_room(
+        await connection_manager.broadcast_event(
             room_id,
-            WebSocketMessage(
-                event="memories_cleared",
-                data={"room_id": room_id, "count": count},
-                room_id=room_id
-            )
+            "memories_cleared",
+            {"room_id": room_id, "count": count}
         )
         
         return {
@@ -3,15 +3,18 @@ Room management API routes.
 Handles room creation, joining, settings, and lifecycle.
 """
 
+import asyncio
 from typing import Optional
 from fastapi import APIRouter, HTTPException, Depends, status
 from pydantic import BaseModel
 
+from core.cache import cache, cache_key, cached, etagged, CACHE_SHORT, CACHE_NORMAL, CACHE_LONG
 from models.room import (
     RoomCreate, RoomJoin, RoomPublic, RoomSettings, 
     RoomOnboarding, ConsentRequest, ConsentStatus
 )
 from models.user import UserInRoom
+from services.bot_service import bot_service
 from services.room_service import room_service
 from services.memory_service import memory_service
 from ws.connection_manager import connection_manager
@@ -20,6 +23,22 @@ from ws.connection_manager import connection_manager
 router = APIRouter(prefix="/rooms", tags=["rooms"])
 
 
+async def _invalidate_room_cache(room_id: int, drop_stale: bool = False) -> None:
+    """
+    Drop every cached read for a room after it changes, in one DEL.
+    
+    Args:
+        room_id: Room that changed
+        drop_stale: Also drop the last-known-good snapshots kept for
+            outage fallback (only when the room itself is gone)
+    """
+    endpoints = (get_room, get_consent_status, get_room_users, get_online_users)
+    keys = [cache_key("room", room_id, endpoint.__name__) for endpoint in endpoints]
+    if drop_stale:
+        keys += [f"{key}:stale" for key in keys]
+    await cache.delete(*keys, bot_service.status_key(room_id))
+
+
 class RoomCreateResponse(BaseModel):
     """Response for room creation."""
     room: RoomPublic
@@ -43,8 +62,7 @@ async def create_room(data: RoomCreate):
     Returns the room info, secret (only shown once), and user.
     """
     try:
-        room, secret, user = await room_service.create_room(data)
-        room_public = await room_service.get_room_public(room.id)
+        room_public, secret, user = await room_service.create_room(data)
         
         return RoomCreateResponse(
             room=room_public,
@@ -68,8 +86,8 @@ async def join_room(data: RoomJoin):
     Room is limited to 2 users maximum.
     """
     try:
-        user, room = await room_service.join_room(data)
-        room_public = await room_service.get_room_public(room.id)
+        user, room_public = await room_service.join_room(data)
+        await _invalidate_room_cache(room_public.id)
         
         return RoomJoinResponse(
             user=user,
@@ -89,6 +107,8 @@ async def join_room(data: RoomJoin):
 
 
 @router.get("/{room_id}", response_model=RoomPublic)
+@etagged()
+@cached(prefix="room", expire=CACHE_NORMAL, stale_fallback=True)
 async def get_room(room_id: int):
     """
     Get room information.
@@ -110,15 +130,21 @@ async def update_room_settings(room_id: int, settings_data: RoomSettings):
     Update room settings.
     """
     try:
-        room = await room_service.update_room_settings(room_id, settings_data)
-        room_public = await room_service.get_room_public(room.id)
-        
-        return {"room": room_public, "message": "Settings updated"}
+        room_public = await room_service.update_room_settings(room_id, settings_data)
+        await _invalidate_room_cache(room_id)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
+    
+    if not room_public:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Room not found"
+        )
+    
+    return {"room": room_public, "message": "Settings updated"}
 
 
 @router.put("/{room_id}/onboarding")
@@ -130,6 +156,7 @@ async def update_room_onboarding(room_id: int, onboarding: RoomOnboarding):
     """
     try:
         room = await room_service.update_room_onboarding(room_id, onboarding)
+        await _invalidate_room_cache(room_id)
         
         return {"message": "Onboarding data saved", "room_id": room.id}
     except Exception as e:
@@ -152,20 +179,17 @@ async def update_nsfw_consent(room_id: int, consent: ConsentRequest):
             consent.user_id,
             consent.consent
         )
+        await _invalidate_room_cache(room_id)
         
-        # Notify room about consent update via WebSocket
-        from models.message import WebSocketMessage
-        await connection_manager.broadcast_to_room(
+        # Notify room about consent update via WebSocket (encoded once for all recipients)
+        await connection_manager.broadcast_event(
             room_id,
-            WebSocketMessage(
-                event="consent_updated",
-                data={
-                    "user_id": consent.user_id,
-                    "nsfw_mode": status_result.nsfw_mode.value,
-                    "both_consented": status_result.both_consented
-                },
-                room_id=room_id
-            )
+            "consent_updated",
+            {
+                "user_id": consent.user_id,
+                "nsfw_mode": status_result.nsfw_mode.value,
+                "both_consented": status_result.both_consented
+            }
         )
         
         return status_result
@@ -177,6 +201,8 @@ async def update_nsfw_consent(room_id: int, consent: ConsentRequest):
 
 
 @router.get("/{room_id}/consent", response_model=ConsentStatus)
+@etagged()
+@cached(prefix="room", expire=CACHE_LONG, stale_fallback=True)
 async def get_consent_status(room_id: int):
     """
     Get current NSFW consent status for the room.
@@ -208,19 +234,23 @@ async def delete_room(room_id: int, hard_delete: bool = False):
         hard_delete: If True, permanently delete all data
     """
     try:
-        # Close all WebSocket connections
-        await connection_manager.close_room_connections(room_id, "Room deleted")
+        # Sockets, vector memories, bot state, and the DB row are independent,
+        # so tear them down concurrently
+        results = await asyncio.gather(
+            connection_manager.close_room_connections(room_id, "Room deleted"),
+            memory_service.clear_room_memories(room_id),
+            bot_service.clear_room_state(room_id),
+            room_service.hard_delete_room(room_id) if hard_delete else room_service.delete_room(room_id),
+            return_exceptions=True
+        )
+        # Invalidate even on partial failure; some state may already be gone
+        await _invalidate_room_cache(room_id, drop_stale=True)
         
-        # Clear memories
-        await memory_service.clear_room_memories(room_id)
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            raise Exception("; ".join(str(e) for e in errors))
         
-        # Delete room
-        if hard_delete:
-            await room_service.hard_delete_room(room_id)
-            message = "Room permanently deleted"
-        else:
-            await room_service.delete_room(room_id)
-            message = "Room deleted"
+        message = "Room permanently deleted" if hard_delete else "Room deleted"
         
         return {"message": message, "room_id": room_id}
     except Exception as e:
@@ -239,6 +269,7 @@ async def reset_room_memory(room_id: int):
     """
     try:
         count = await memory_service.clear_room_memories(room_id)
+        await bot_service.clear_room_state(room_id)
         
         return {
             "message": "Memory reset successfully",
@@ -253,6 +284,7 @@ async def reset_room_memory(room_id: int):
 
 
 @router.get("/{room_id}/users")
+@cached(prefix="room", expire=CACHE_NORMAL, stale_fallback=True)
 async def get_room_users(room_id: int):
     """
     Get all users in a room.
@@ -267,6 +299,7 @@ async def get_room_users(room_id: int):
 
 
 @router.get("/{room_id}/online")
+@cached(prefix="room", expire=CACHE_SHORT)
 async def get_online_users(room_id: int):
     """
     Get currently online users in a room.
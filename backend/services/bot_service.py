@@ -3,18 +3,82 @@ Bot service for AI assistant interactions.
 Uses OpenRouter or Groq API for cloud LLM access.
 """
 
+import re
+import asyncio
+import logging
+import hashlib
 import httpx
-from typing import List, Optional, Dict, Any
+import orjson
+from typing import List, Optional, Dict, Any, Awaitable, Callable, Set, Tuple
+from cachetools import LRUCache, TTLCache
 from datetime import datetime
 
 from config import settings
+from core.cache import cache
+from core.http_client import http_client
 from models.room import NSFWMode
 from services.room_service import room_service
 
 
-# Simple in-memory storage (persists during server runtime)
-_name_memory: Dict[int, Dict[str, str]] = {}  # room_id -> {user_id: name}
-_conversation_history: Dict[int, List[Dict]] = {}  # room_id -> messages
+logger = logging.getLogger("bot")
+
+# Receives each streamed chunk of a bot reply as it arrives
+TokenCallback = Callable[[str], Awaitable[None]]
+
+# Process-local fallback when Redis is not configured
+# Idle rooms are evicted after LOCAL_STATE_TTL (the Redis keys expire the same
+# way); at most LOCAL_STATE_ROOMS are kept
+LOCAL_STATE_ROOMS = 10_000
+LOCAL_STATE_TTL = 86400
+_name_memory: TTLCache = TTLCache(maxsize=LOCAL_STATE_ROOMS, ttl=LOCAL_STATE_TTL)  # room_id -> {user_id: name}
+_conversation_history: TTLCache = TTLCache(maxsize=LOCAL_STATE_ROOMS, ttl=LOCAL_STATE_TTL)  # room_id -> messages
+# TTLCache is not thread-safe; serialize mutations
+_local_state_lock = asyncio.Lock()
+
+# Conversation turns kept per room
+HISTORY_LIMIT = 20
+
+# Bot status is fresh for STATUS_TTL and may be served stale up to STATUS_STALE
+STATUS_TTL = 30
+STATUS_STALE = 300
+
+# Self-introduction followed by the name itself, e.g. "call me Sam"
+_NAME_RE = re.compile(
+    r"\b(?:my name is|i'?m|i am|call me|name'?s)\s+([A-Za-z][A-Za-z\-']{1,30})",
+    re.IGNORECASE
+)
+
+# Fallback intents, in priority order
+_INTENT_PHRASES = {
+    "ask_name": ("what's my name", "do you know my name", "remember my name", "who am i"),
+    "greeting": ("hello", "hi ", "hey", "hi!"),
+    "how_are_you": ("how are you", "how're you", "how r u"),
+    "love": ("love you", "i love"),
+    "thanks": ("thank", "thanks"),
+    "bye": ("bye", "goodbye", "good night", "goodnight"),
+}
+
+_TRIGGER_TAGS: Dict[str, str] = {}
+for _tag, _phrases in _INTENT_PHRASES.items():
+    _TRIGGER_TAGS.update((phrase, _tag) for phrase in _phrases)
+
+# Zero-width lookahead so overlapping phrases are all found in one pass
+_TRIGGER_RE = re.compile(
+    "(?=(" + "|".join(re.escape(p) for p in sorted(_TRIGGER_TAGS, key=len, reverse=True)) + "))"
+)
+
+
+def _scan_intents(msg_lower: str) -> Set[str]:
+    """
+    Find every fallback intent in a lowercased message with a single scan.
+    
+    Args:
+        msg_lower: Lowercased message text
+        
+    Returns:
+        Set of matched intent tags
+    """
+    return {_TRIGGER_TAGS[match.group(1)] for match in _TRIGGER_RE.finditer(msg_lower)}
 
 
 class BotService:
@@ -25,77 +89,199 @@ class BotService:
     
     OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
     
+    # Concurrent Groq calls allowed before callers queue
+    GROQ_MAX_CONCURRENCY = 8
+    
+    # Built system prompts kept per (room, user, NSFW mode)
+    PROMPT_CACHE_SIZE = 1024
+    
     def __init__(self):
         """Initialize bot service."""
-        self._http_client = None
         self._groq_client = None
+        self._groq_semaphore = asyncio.Semaphore(self.GROQ_MAX_CONCURRENCY)
+        # (room_id, user_id, nsfw_enabled) -> (names snapshot, built system prompt)
+        self._prompt_cache: LRUCache = LRUCache(maxsize=self.PROMPT_CACHE_SIZE)
+        # request hash -> Future shared by concurrent identical bot turns
+        self._inflight: Dict[str, asyncio.Future] = {}
     
     def _get_client(self) -> httpx.AsyncClient:
-        """Get HTTP client for API calls."""
-        if self._http_client is None:
-            self._http_client = httpx.AsyncClient(timeout=30.0)
-        return self._http_client
+        """Get the shared, lifespan-managed HTTP client for API calls."""
+        return http_client.client
     
     def _get_groq_client(self):
-        """Get Groq client for API calls."""
+        """Get async Groq client for API calls."""
         if self._groq_client is None:
             try:
-                from groq import Groq
-                self._groq_client = Groq(api_key=settings.groq_api_key)
+                from groq import AsyncGroq
+                self._groq_client = AsyncGroq(api_key=settings.groq_api_key)
             except ImportError:
-                print("❌ Groq package not installed. Install with: pip install groq")
+                logger.error("Groq package not installed. Install with: pip install groq")
                 return None
         return self._groq_client
     
-    def _remember_name(self, room_id: int, user_id: str, name: str):
+    @staticmethod
+    def _names_key(room_id: int) -> str:
+        return f"name:{room_id}"
+    
+    @staticmethod
+    def _history_key(room_id: int) -> str:
+        return f"hist:{room_id}"
+    
+    @staticmethod
+    def status_key(room_id: int) -> str:
+        return f"botstatus:{room_id}"
+    
+    async def _remember_name(self, room_id: int, user_id: str, name: str):
         """Store a user's name in memory."""
-        if room_id not in _name_memory:
-            _name_memory[room_id] = {}
-        _name_memory[room_id][user_id] = name
-        print(f"💾 Remembered name: {name} for user {user_id} in room {room_id}")
+        if cache.is_connected:
+            key = self._names_key(room_id)
+            async with cache.client.pipeline(transaction=True) as pipe:
+                pipe.hset(key, user_id, name)
+                pipe.expire(key, LOCAL_STATE_TTL)
+                pipe.delete(self.status_key(room_id))
+                await pipe.execute()
+        else:
+            async with _local_state_lock:
+                names = _name_memory.get(room_id, {})
+                names[user_id] = name
+                # Re-insert so the room's TTL restarts on activity
+                _name_memory[room_id] = names
+        logger.debug("Remembered name %s for user %s in room %s", name, user_id, room_id)
     
-    def _get_remembered_name(self, room_id: int, user_id: str) -> Optional[str]:
+    async def _get_remembered_name(self, room_id: int, user_id: str) -> Optional[str]:
         """Get a user's remembered name."""
+        if cache.is_connected:
+            name = await cache.client.hget(self._names_key(room_id), user_id)
+            return name.decode() if name is not None else None
         return _name_memory.get(room_id, {}).get(user_id)
     
-    def _get_all_names(self, room_id: int) -> Dict[str, str]:
+    async def _get_all_names(self, room_id: int) -> Dict[str, str]:
         """Get all remembered names in a room."""
+        if cache.is_connected:
+            names = await cache.client.hgetall(self._names_key(room_id))
+            return {k.decode(): v.decode() for k, v in names.items()}
         return _name_memory.get(room_id, {})
     
-    def _add_to_history(self, room_id: int, role: str, content: str):
+    async def _add_to_history(self, room_id: int, role: str, content: str):
         """Add message to conversation history."""
-        if room_id not in _conversation_history:
-            _conversation_history[room_id] = []
-        _conversation_history[room_id].append({"role": role, "content": content})
-        # Keep last 20 messages
-        if len(_conversation_history[room_id]) > 20:
-            _conversation_history[room_id] = _conversation_history[room_id][-20:]
+        if cache.is_connected:
+            # Newest first; LTRIM keeps the list a fixed-size ring
+            key = self._history_key(room_id)
+            async with cache.client.pipeline(transaction=True) as pipe:
+                pipe.lpush(key, orjson.dumps({"role": role, "content": content}))
+                pipe.ltrim(key, 0, HISTORY_LIMIT - 1)
+                pipe.expire(key, LOCAL_STATE_TTL)
+                await pipe.execute()
+            return
+        
+        async with _local_state_lock:
+            history = _conversation_history.get(room_id, [])
+            history.append({"role": role, "content": content})
+            # Keep last 20 messages; re-insert so the room's TTL restarts on activity
+            _conversation_history[room_id] = history[-HISTORY_LIMIT:]
     
-    def _get_history(self, room_id: int) -> List[Dict]:
-        """Get conversation history for a room."""
+    async def _get_history(self, room_id: int) -> List[Dict]:
+        """Get conversation history for a room, oldest first."""
+        if cache.is_connected:
+            raw = await cache.client.lrange(self._history_key(room_id), 0, HISTORY_LIMIT - 1)
+            return [orjson.loads(item) for item in reversed(raw)]
         return _conversation_history.get(room_id, [])
     
-    def _extract_and_remember_name(self, message: str, room_id: int, user_id: str) -> Optional[str]:
+    async def clear_room_state(self, room_id: int) -> None:
+        """Forget remembered names and conversation history for a room."""
+        if cache.is_connected:
+            await cache.delete(self._names_key(room_id), self._history_key(room_id))
+        async with _local_state_lock:
+            _name_memory.pop(room_id, None)
+            _conversation_history.pop(room_id, None)
+        for key in [k for k in self._prompt_cache if k[0] == room_id]:
+            self._prompt_cache.pop(key, None)
+    
+    @staticmethod
+    def _parse_name(message: str) -> Optional[str]:
+        """Parse a self-introduced name from a message, if any."""
+        match = _NAME_RE.search(message)
+        if match is None:
+            return None
+        name = match.group(1).rstrip("'-")
+        return name.capitalize() if len(name) > 1 else None
+    
+    async def _extract_and_remember_name(self, message: str, room_id: int, user_id: str) -> Optional[str]:
         """Extract name from message if mentioned."""
-        msg_lower = message.lower()
-        name_phrases = ["my name is", "i'm ", "i am ", "call me ", "name's "]
-        
-        for phrase in name_phrases:
-            if phrase in msg_lower:
-                idx = msg_lower.find(phrase) + len(phrase)
-                remaining = message[idx:].strip()
-                if remaining:
-                    # Get first word as name
-                    name = remaining.split()[0].strip(".,!?'\"")
-                    if name and len(name) > 1:
-                        self._remember_name(room_id, user_id, name.capitalize())
-                        return name.capitalize()
-        return None
+        name = self._parse_name(message)
+        if name:
+            await self._remember_name(room_id, user_id, name)
+        return name
     
-    def _build_system_prompt(self, room_id: int, user_id: str, nsfw_enabled: bool = False) -> str:
+    async def _record_user_turn(
+        self,
+        room_id: int,
+        user_id: str,
+        user_message: str
+    ) -> Tuple[List[Dict], Dict[str, str]]:
+        """
+        Record a user message and read back the state needed for the prompt.
+        
+        With Redis, the name write, history push/trim, and the history and
+        names reads go out as one pipelined round-trip.
+        
+        Args:
+            room_id: Room identifier
+            user_id: User who sent the message
+            user_message: The user's message
+            
+        Returns:
+            Tuple of (history oldest first, remembered names by user id)
+        """
+        name = self._parse_name(user_message)
+        
+        if not cache.is_connected:
+            if name:
+                await self._remember_name(room_id, user_id, name)
+            await self._add_to_history(room_id, "user", user_message)
+            return await self._get_history(room_id), await self._get_all_names(room_id)
+        
+        names_key = self._names_key(room_id)
+        history_key = self._history_key(room_id)
+        
+        async with cache.client.pipeline(transaction=False) as pipe:
+            if name:
+                pipe.hset(names_key, user_id, name)
+                pipe.expire(names_key, LOCAL_STATE_TTL)
+                pipe.delete(self.status_key(room_id))
+            pipe.lpush(history_key, orjson.dumps({"role": "user", "content": user_message}))
+            pipe.ltrim(history_key, 0, HISTORY_LIMIT - 1)
+            pipe.expire(history_key, LOCAL_STATE_TTL)
+            pipe.lrange(history_key, 0, HISTORY_LIMIT - 1)
+            pipe.hgetall(names_key)
+            results = await pipe.execute()
+        
+        if name:
+            logger.debug("Remembered name %s for user %s in room %s", name, user_id, room_id)
+        
+        raw_history, raw_names = results[-2], results[-1]
+        history = [orjson.loads(item) for item in reversed(raw_history)]
+        names = {k.decode(): v.decode() for k, v in raw_names.items()}
+        return history, names
+    
+    async def _build_system_prompt(
+        self,
+        room_id: int,
+        user_id: str,
+        nsfw_enabled: bool = False,
+        names: Optional[Dict[str, str]] = None
+    ) -> str:
         """Build system prompt with psychological depth and erotic hosting capabilities."""
-        names = self._get_all_names(room_id)
-        current_name = self._get_remembered_name(room_id, user_id)
+        if names is None:
+            names = await self._get_all_names(room_id)
+        
+        # Reuse the built prompt while the room's remembered names are unchanged
+        key = (room_id, user_id, nsfw_enabled)
+        cached = self._prompt_cache.get(key)
+        if cached is not None and cached[0] == names:
+            return cached[1]
+        
+        current_name = names.get(user_id)
         
         # The New Psychological Doctor/Companion Base
         base_prompt = (
@@ -110,8 +296,7 @@ class BotService:
             base_prompt += f"\n\nYou are currently speaking with {current_name}."
         
         if names:
-            names_str = ", ".join([f"{v}" for v in names.values()])
-            base_prompt += f"\nParticipants in this private space: {names_str}."
+            base_prompt += f"\nParticipants in this private space: {', '.join(names.values())}."
         
         # The Erotic Host Enhancement
         if nsfw_enabled:
@@ -123,127 +308,219 @@ class BotService:
                 "psychological insight to ensure the play remains consensual and connected."
             )
         
+        self._prompt_cache[key] = (dict(names), base_prompt)
         return base_prompt
     
-    async def _call_openrouter(self, messages: List[Dict], room_id: int, user_id: str, nsfw_enabled: bool = False) -> str:
+    async def _call_openrouter(
+        self,
+        messages: List[Dict],
+        room_id: int,
+        user_id: str,
+        nsfw_enabled: bool = False,
+        names: Optional[Dict[str, str]] = None,
+        on_token: Optional[TokenCallback] = None
+    ) -> str:
         """Call OpenRouter API."""
-        print(f"🤖 OpenRouter API key present: {bool(settings.openrouter_api_key)}")
-        print(f"🤖 Model: {settings.openrouter_model}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "OpenRouter API key present: %s, model: %s",
+                bool(settings.openrouter_api_key), settings.openrouter_model
+            )
         
         if not settings.openrouter_api_key:
-            print("⚠️ No API key, using simple response")
+            logger.warning("No OpenRouter API key, using simple response")
             return await self._simple_response(messages[-1]["content"] if messages else "", room_id, user_id)
         
-        system_prompt = self._build_system_prompt(room_id, user_id, nsfw_enabled)
+        system_prompt = await self._build_system_prompt(room_id, user_id, nsfw_enabled, names)
         
         full_messages = [{"role": "system", "content": system_prompt}] + messages
         
         try:
             client = self._get_client()
-            print(f"🤖 Calling OpenRouter with {len(full_messages)} messages...")
+            logger.debug("Calling OpenRouter with %d messages", len(full_messages))
+            headers = {
+                "Authorization": f"Bearer {settings.openrouter_api_key}",
+                "Content-Type": "application/json",
+                "HTTP-Referer": "https://nushur.app",
+                "X-Title": "Nushur Chat"
+            }
+            payload = {
+                "model": settings.openrouter_model,
+                "messages": full_messages,
+                "max_tokens": settings.llm_max_tokens,
+                "temperature": settings.llm_temperature,
+            }
+            
+            if on_token is not None:
+                result = await self._stream_openrouter(client, headers, payload, on_token)
+                if result is not None:
+                    return result
+                return await self._simple_response(messages[-1]["content"] if messages else "", room_id, user_id)
+            
             response = await client.post(
                 self.OPENROUTER_URL,
-                headers={
-                    "Authorization": f"Bearer {settings.openrouter_api_key}",
-                    "Content-Type": "application/json",
-                    "HTTP-Referer": "https://nushur.app",
-                    "X-Title": "Nushur Chat"
-                },
-                json={
-                    "model": settings.openrouter_model,
-                    "messages": full_messages,
-                    "max_tokens": settings.llm_max_tokens,
-                    "temperature": settings.llm_temperature,
-                }
+                headers=headers,
+                content=orjson.dumps(payload)
             )
             
             if response.status_code == 200:
-                data = response.json()
+                data = orjson.loads(response.content)
                 result = data["choices"][0]["message"]["content"]
-                print(f"✅ OpenRouter response: {result[:100]}...")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("OpenRouter response: %s", result[:100])
                 return result
             else:
-                print(f"❌ OpenRouter error: {response.status_code} - {response.text}")
+                logger.error("OpenRouter error: %s - %s", response.status_code, response.text)
                 return await self._simple_response(messages[-1]["content"] if messages else "", room_id, user_id)
                 
         except Exception as e:
-            print(f"OpenRouter exception: {e}")
+            logger.exception("OpenRouter request failed: %s", e)
             return await self._simple_response(messages[-1]["content"] if messages else "", room_id, user_id)
     
-    async def _call_groq(self, messages: List[Dict], room_id: int, user_id: str, nsfw_enabled: bool = False) -> str:
+    async def _stream_openrouter(
+        self,
+        client: httpx.AsyncClient,
+        headers: Dict[str, str],
+        payload: Dict[str, Any],
+        on_token: TokenCallback
+    ) -> Optional[str]:
+        """
+        Stream an OpenRouter completion, forwarding each chunk as it arrives.
+        
+        Args:
+            client: HTTP client
+            headers: Request headers
+            payload: Chat completion request body
+            on_token: Called with each content chunk
+            
+        Returns:
+            Full response text, or None if the API returned an error
+        """
+        parts: List[str] = []
+        
+        async with client.stream(
+            "POST",
+            self.OPENROUTER_URL,
+            headers=headers,
+            content=orjson.dumps({**payload, "stream": True})
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                logger.error("OpenRouter error: %s - %s", response.status_code, response.text)
+                return None
+            
+            # Server-sent events; lines starting with ":" are keep-alive comments
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                
+                chunk = orjson.loads(data)
+                choices = chunk.get("choices")
+                token = choices[0].get("delta", {}).get("content") if choices else None
+                if token:
+                    parts.append(token)
+                    await on_token(token)
+        
+        result = "".join(parts)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("OpenRouter streamed response: %s", result[:100])
+        return result
+    
+    async def _call_groq(
+        self,
+        messages: List[Dict],
+        room_id: int,
+        user_id: str,
+        nsfw_enabled: bool = False,
+        names: Optional[Dict[str, str]] = None,
+        on_token: Optional[TokenCallback] = None
+    ) -> str:
         """Call Groq API using official Python client."""
-        print(f"🤖 Groq API key present: {bool(settings.groq_api_key)}")
-        print(f"🤖 Model: {settings.groq_model}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Groq API key present: %s, model: %s",
+                bool(settings.groq_api_key), settings.groq_model
+            )
         
         if not settings.groq_api_key:
-            print("⚠️ No Groq API key, using simple response")
+            logger.warning("No Groq API key, using simple response")
             return await self._simple_response(messages[-1]["content"] if messages else "", room_id, user_id)
         
         groq_client = self._get_groq_client()
         if not groq_client:
-            print("⚠️ Groq client not available, using simple response")
+            logger.warning("Groq client not available, using simple response")
             return await self._simple_response(messages[-1]["content"] if messages else "", room_id, user_id)
         
-        system_prompt = self._build_system_prompt(room_id, user_id, nsfw_enabled)
+        system_prompt = await self._build_system_prompt(room_id, user_id, nsfw_enabled, names)
         
         full_messages = [{"role": "system", "content": system_prompt}] + messages
         
         try:
-            print(f"🤖 Calling Groq with {len(full_messages)} messages...")
+            logger.debug("Calling Groq with %d messages", len(full_messages))
             
-            # Run Groq client in thread pool since it's synchronous
-            import asyncio
-            loop = asyncio.get_event_loop()
-            completion = await loop.run_in_executor(
-                None,
-                lambda: groq_client.chat.completions.create(
+            # Native async client; the semaphore bounds in-flight calls under bursts
+            async with self._groq_semaphore:
+                completion = await groq_client.chat.completions.create(
                     model=settings.groq_model,
                     messages=full_messages,
                     max_tokens=settings.llm_max_tokens,
                     temperature=settings.llm_temperature,
+                    stream=on_token is not None,
                 )
-            )
-            
-            result = completion.choices[0].message.content
-            print(f"✅ Groq response: {result[:100]}...")
+                
+                if on_token is None:
+                    result = completion.choices[0].message.content
+                else:
+                    parts: List[str] = []
+                    async for chunk in completion:
+                        token = chunk.choices[0].delta.content if chunk.choices else None
+                        if token:
+                            parts.append(token)
+                            await on_token(token)
+                    result = "".join(parts)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Groq response: %s", result[:100])
             return result
                 
         except Exception as e:
-            print(f"Groq exception: {e}")
+            logger.exception("Groq request failed: %s", e)
             return await self._simple_response(messages[-1]["content"] if messages else "", room_id, user_id)
     
     async def _simple_response(self, message: str, room_id: int, user_id: str) -> str:
         """Simple fallback response when API is not available."""
-        msg_lower = message.lower()
-        
         # Check for name introduction
-        extracted_name = self._extract_and_remember_name(message, room_id, user_id)
+        extracted_name = await self._extract_and_remember_name(message, room_id, user_id)
         if extracted_name:
             return f"Nice to meet you, {extracted_name}! I'll remember that."
         
+        intents = _scan_intents(message.lower())
+        
         # Check if asking about name
-        remembered = self._get_remembered_name(room_id, user_id)
-        if any(x in msg_lower for x in ["what's my name", "do you know my name", "remember my name", "who am i"]):
+        remembered = await self._get_remembered_name(room_id, user_id)
+        if "ask_name" in intents:
             if remembered:
                 return f"Of course! Your name is {remembered}"
             return "I don't think you've told me your name yet. What should I call you?"
         
         # Simple greetings
-        if any(x in msg_lower for x in ["hello", "hi ", "hey", "hi!"]):
+        if "greeting" in intents:
             if remembered:
                 return f"Hey {remembered}! How are you doing?"
             return "Hey there! How can I help you today?"
         
-        if any(x in msg_lower for x in ["how are you", "how're you", "how r u"]):
+        if "how_are_you" in intents:
             return "I'm doing great, thanks for asking! How about you?"
         
-        if any(x in msg_lower for x in ["love you", "i love"]):
+        if "love" in intents:
             return "Aww, that's so sweet!"
         
-        if any(x in msg_lower for x in ["thank", "thanks"]):
+        if "thanks" in intents:
             return "You're welcome!"
         
-        if any(x in msg_lower for x in ["bye", "goodbye", "good night", "goodnight"]):
+        if "bye" in intents:
             if remembered:
                 return f"Bye {remembered}! Take care"
             return "Goodbye! Take care"
@@ -257,48 +534,105 @@ class BotService:
         self,
         room_id: int,
         user_message: str,
-        user_id: str
+        user_id: str,
+        on_token: Optional[TokenCallback] = None
     ) -> str:
         """
         Generate a bot response to a user message.
         
+        Identical concurrent requests (same room, user, and message) share
+        a single LLM call; later callers await the first caller's result
+        and do not receive streamed tokens. If the first caller is
+        cancelled, a waiter takes over the generation.
+        
         Args:
             room_id: Room identifier
             user_message: The user's message
             user_id: User who sent the message
+            on_token: Optional callback receiving the reply as it streams in
             
         Returns:
             Bot response text
         """
-        # Extract and remember name if mentioned
-        self._extract_and_remember_name(user_message, room_id, user_id)
+        key = hashlib.sha1(f"{room_id}|{user_message}|{user_id}".encode()).hexdigest()
         
-        # Add user message to history
-        self._add_to_history(room_id, "user", user_message)
+        while (inflight := self._inflight.get(key)) is not None:
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # Only the first caller was cancelled: generate (or join
+                # whichever waiter got there first) instead of failing too
+                if inflight.cancelled() and not asyncio.current_task().cancelling():
+                    continue
+                raise
+        
+        # No await between the lookup and the insert, so this is atomic on the loop
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            response = await self._generate_response(room_id, user_message, user_id, on_token)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved when nobody else is waiting
+            raise
+        else:
+            future.set_result(response)
+            return response
+        finally:
+            self._inflight.pop(key, None)
+    
+    async def _generate_response(
+        self,
+        room_id: int,
+        user_message: str,
+        user_id: str,
+        on_token: Optional[TokenCallback] = None
+    ) -> str:
+        """Run one bot turn: update memory, call the LLM, record history."""
+        # Remember name, add to history, and read history and names back
+        history, names = await self._record_user_turn(room_id, user_id, user_message)
         
         # Get room for NSFW mode check
         room = await room_service.get_room(room_id)
         nsfw_enabled = room.nsfw_mode == NSFWMode.ENABLED if room else False
         
-        # Get conversation history
-        history = self._get_history(room_id)
-        
         # Generate response
         if settings.llm_provider == "groq" and settings.groq_api_key:
-            response = await self._call_groq(history, room_id, user_id, nsfw_enabled)
+            response = await self._call_groq(history, room_id, user_id, nsfw_enabled, names, on_token)
         elif settings.llm_provider == "openrouter" and settings.openrouter_api_key:
-            response = await self._call_openrouter(history, room_id, user_id, nsfw_enabled)
+            response = await self._call_openrouter(history, room_id, user_id, nsfw_enabled, names, on_token)
         else:
             response = await self._simple_response(user_message, room_id, user_id)
         
-        # Add bot response to history
-        self._add_to_history(room_id, "assistant", response)
+        # Awaited (one cheap append) so the next user turn can't reach the
+        # history first; the message row itself is inserted by the caller
+        await self._persist_reply(room_id, response)
         
         return response
     
+    async def _persist_reply(self, room_id: int, response: str) -> None:
+        """Add a bot response to history, logging instead of raising on failure."""
+        try:
+            await self._add_to_history(room_id, "assistant", response)
+        except Exception as e:
+            logger.exception("Failed to record bot reply for room %s: %s", room_id, e)
+    
     async def get_bot_status(self, room_id: int) -> Dict[str, Any]:
-        """Get current bot status for a room."""
+        """Get current bot status for a room (stale-while-revalidate cached)."""
+        return await cache.swr(
+            self.status_key(room_id),
+            lambda: self._load_bot_status(room_id),
+            ttl=STATUS_TTL,
+            stale=STATUS_STALE
+        )
+    
+    async def _load_bot_status(self, room_id: int) -> Dict[str, Any]:
+        """Build bot status for a room from the room record and memory."""
         room = await room_service.get_room(room_id)
+        names = await self._get_all_names(room_id)
         
         return {
             "active": True,
@@ -306,7 +640,7 @@ class BotService:
             "ai_enabled": bool(settings.openrouter_api_key or settings.groq_api_key),
             "provider": settings.llm_provider,
             "model": settings.groq_model if settings.llm_provider == "groq" else settings.openrouter_model,
-            "names_remembered": len(self._get_all_names(room_id)),
+            "names_remembered": len(names),
         }
 
 
@@ -3,9 +3,20 @@ Memory service for ChromaDB vector storage and retrieval.
 Handles embedding storage, deduplication, and memory lifecycle.
 """
 
+import time
+import logging
+import calendar
+import copy
 import uuid
+import heapq
+import functools
+import asyncio
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from collections import Counter
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional, Dict, Any, Tuple, Union
+
+import numpy as np
 
 try:
     import chromadb
@@ -15,8 +26,356 @@ except ImportError:
     CHROMADB_AVAILABLE = False
     print("⚠️ ChromaDB not installed. Memory features will be disabled.")
 
+try:
+    import simsimd
+    SIMSIMD_AVAILABLE = True
+except ImportError:
+    SIMSIMD_AVAILABLE = False
+
 from config import settings
 from models.message import MemoryEntry, MemoryCategory, MemorySearchResult
+from ws.connection_manager import connection_manager
+
+logger = logging.getLogger(__name__)
+
+
+def _onnx_model_kwargs(onnx_file: str) -> Dict[str, Any]:
+    """Build ONNX Runtime session settings for the embedding model."""
+    import onnxruntime as ort
+    
+    session_options = ort.SessionOptions()
+    session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    # intra_op_num_threads is left at ORT's default (all physical cores);
+    # MemoryService keeps its executor small so passes don't oversubscribe
+    
+    model_kwargs: Dict[str, Any] = {
+        "provider": "CPUExecutionProvider",
+        "session_options": session_options,
+    }
+    if onnx_file:
+        model_kwargs["file_name"] = onnx_file
+    return model_kwargs
+
+
+@functools.lru_cache(maxsize=1)
+def _load_embedding_model(name: str, backend: str, onnx_file: str):
+    """
+    Load the embedding model once per process, preferring ONNX Runtime.
+    
+    Cached at module level so every MemoryService instance shares the
+    same weights instead of loading its own copy.
+    
+    Args:
+        name: Sentence-transformers model name
+        backend: "onnx" or "torch"
+        onnx_file: ONNX file within the model repo, or "" for the default
+        
+    Returns:
+        Loaded SentenceTransformer
+    """
+    from sentence_transformers import SentenceTransformer
+    
+    if backend == "onnx":
+        try:
+            model = SentenceTransformer(
+                name,
+                backend="onnx",
+                model_kwargs=_onnx_model_kwargs(onnx_file)
+            )
+            print(f"🧠 Embedding model loaded with ONNX Runtime ({onnx_file or 'fp32'})")
+            return model
+        except Exception as e:
+            logger.warning("ONNX embedding backend unavailable (%s), falling back to PyTorch", e)
+    
+    return SentenceTransformer(name)
+
+
+def _ts_ns(metadata: Dict[str, Any]) -> int:
+    """Epoch nanoseconds of a memory, parsing the ISO string only for legacy rows."""
+    ts_ns = metadata.get("ts_ns")
+    if ts_ns is not None:
+        return ts_ns
+    timestamp = metadata.get("timestamp")
+    if not timestamp:
+        return 0
+    parsed = datetime.fromisoformat(timestamp)
+    return calendar.timegm(parsed.utctimetuple()) * 10**9 + parsed.microsecond * 1000
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first."""
+    if k >= len(scores):
+        return np.argsort(-scores)
+    top = np.argpartition(scores, -k)[-k:]
+    return top[np.argsort(-scores[top])]
+
+
+# SimSIMD has native fp16 dot kernels, halving memory traffic on the
+# bandwidth-bound scoring path; numpy would upcast fp16 on every matvec
+VECTOR_DTYPE = np.float16 if SIMSIMD_AVAILABLE else np.float32
+
+
+def _dot_rows(matrix: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Dot product of query with every row of matrix, as float32."""
+    if SIMSIMD_AVAILABLE and len(matrix):
+        # One SIMD kernel call over every row (AVX-512/AVX2/NEON picked at runtime)
+        query = np.ascontiguousarray(query, dtype=matrix.dtype)
+        return np.asarray(simsimd.cdist(query[None, :], matrix, metric="dot"), dtype=np.float32)[0]
+    return matrix @ query
+
+
+def _any_above(query: np.ndarray, matrix: np.ndarray, threshold: float, block: int = 2048) -> bool:
+    """
+    Check whether any row's similarity with query reaches threshold.
+    
+    Rows are scored in blocks, newest first, and the scan stops at the
+    first block containing a match. Near-duplicates are usually recent,
+    so a hit typically costs one block instead of the whole room.
+    
+    Args:
+        query: Unit-norm query vector
+        matrix: (N, D) unit-norm rows, oldest first
+        threshold: Cosine similarity threshold
+        block: Rows per step
+        
+    Returns:
+        True if some row's similarity is >= threshold
+    """
+    for end in range(len(matrix), 0, -block):
+        if float(_dot_rows(matrix[max(end - block, 0):end], query).max()) >= threshold:
+            return True
+    return False
+
+
+def _quantize(vectors: np.ndarray) -> np.ndarray:
+    """
+    Scale-quantize float vectors to int8, one scale per row.
+    
+    Cosine similarity is scale-invariant, so the per-row scale is not
+    needed for ranking and is not kept.
+    """
+    scale = np.max(np.abs(vectors), axis=-1, keepdims=True) / 127
+    return np.round(vectors / np.where(scale == 0, 1, scale)).astype(np.int8)
+
+
+class RoomVectors:
+    """
+    In-memory copy of one room's memory embeddings.
+    Rows are L2-normalized so a dot product is the cosine similarity.
+    An int8 copy is kept for fast approximate ranking; the VECTOR_DTYPE
+    matrix serves threshold checks and exact rescoring.
+    """
+    
+    def __init__(
+        self,
+        ids: List[str],
+        embeddings: Any,
+        metadatas: List[Dict[str, Any]],
+        documents: List[str]
+    ):
+        self.ids: List[str] = list(ids)
+        self.metadatas: List[Dict[str, Any]] = list(metadatas or [{} for _ in self.ids])
+        self.documents: List[str] = list(documents or ["" for _ in self.ids])
+        # category value -> number of rows, kept in step with append/remove
+        self.category_counts: Counter = Counter(meta.get("category") for meta in self.metadatas)
+        
+        matrix = np.asarray(embeddings if self.ids else [], dtype=np.float32)
+        matrix = matrix.reshape(len(self.ids), settings.embedding_dimension)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        # Preallocated C-order arenas; rows [0, len) are live and contiguous,
+        # so scoring is one BLAS matvec over a view with no copies
+        matrix = matrix / np.where(norms == 0, 1, norms)
+        self._matrix = np.ascontiguousarray(matrix, dtype=VECTOR_DTYPE)
+        self._quantized = _quantize(matrix)
+        # Monotonic load time, for the ROOM_CACHE_TTL backstop
+        self.loaded_at = time.monotonic()
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    @property
+    def matrix(self) -> np.ndarray:
+        """Normalized rows in VECTOR_DTYPE, shape (N, D)."""
+        return self._matrix[:len(self.ids)]
+    
+    @property
+    def quantized(self) -> np.ndarray:
+        """int8 copy of the rows, shape (N, D)."""
+        return self._quantized[:len(self.ids)]
+    
+    def _reserve(self, rows: int) -> None:
+        """Grow the arenas by doubling so appends are amortized O(D)."""
+        capacity = len(self._matrix)
+        if rows <= capacity:
+            return
+        capacity = max(rows, capacity * 2, 16)
+        for name in ("_matrix", "_quantized"):
+            old = getattr(self, name)
+            grown = np.empty((capacity, old.shape[1]), dtype=old.dtype)
+            grown[:len(self.ids)] = old[:len(self.ids)]
+            setattr(self, name, grown)
+    
+    def append(self, id_: str, vector: np.ndarray, metadata: Dict[str, Any], document: str) -> None:
+        """Add one normalized row."""
+        n = len(self.ids)
+        self._reserve(n + 1)
+        self._matrix[n] = vector
+        self._quantized[n] = _quantize(np.asarray(vector, dtype=np.float32))
+        self.ids.append(id_)
+        self.metadatas.append(metadata)
+        self.documents.append(document)
+        self.category_counts[metadata.get("category")] += 1
+    
+    def remove(self, ids: Iterable[str]) -> None:
+        """Drop rows by memory id, into fresh arrays so snapshots stay valid."""
+        drop = set(ids)
+        keep = [i for i, id_ in enumerate(self.ids) if id_ not in drop]
+        self.category_counts.subtract(
+            meta.get("category") for id_, meta in zip(self.ids, self.metadatas) if id_ in drop
+        )
+        self._matrix = self._matrix[keep]
+        self._quantized = self._quantized[keep]
+        self.ids = [self.ids[i] for i in keep]
+        self.metadatas = [self.metadatas[i] for i in keep]
+        self.documents = [self.documents[i] for i in keep]
+    
+    def snapshot(self) -> "RoomVectors":
+        """
+        Freeze the current rows for scoring on a worker thread.
+        
+        Later appends write past the snapshot's rows and removals allocate
+        new arrays, so the snapshot is unaffected by either.
+        """
+        frozen = copy.copy(self)
+        frozen.ids = list(self.ids)
+        return frozen
+    
+    def rows_in_category(self, category: Optional[MemoryCategory]) -> np.ndarray:
+        """Row indices, optionally restricted to one category."""
+        if category is None:
+            return np.arange(len(self.ids))
+        return np.array(
+            [i for i, meta in enumerate(self.metadatas) if meta.get("category") == category.value],
+            dtype=np.intp
+        )
+    
+    def scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Cosine similarity of a normalized query against all (or selected) rows."""
+        # Rows and query are unit-norm, so the dot product is the cosine
+        return _dot_rows(self.matrix if rows is None else self.matrix[rows], query)
+    
+    def rank_scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Approximate cosine similarity for ranking, using the int8 copy.
+        
+        Falls back to exact float32 scores without SimSIMD, since numpy
+        has no int8 dot-product kernel that beats float32 BLAS.
+        """
+        if not SIMSIMD_AVAILABLE:
+            return self.scores(query, rows)
+        
+        quantized = self.quantized if rows is None else self.quantized[rows]
+        if not len(quantized):
+            return np.empty(0, dtype=np.float32)
+        distances = simsimd.cdist(_quantize(query)[None, :], quantized, metric="cosine")
+        return 1 - np.asarray(distances, dtype=np.float32)[0]
+    
+    def search(self, query: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rank rows on the int8 copy, then score the winners exactly.
+        
+        Returns:
+            (row indices, float32 similarities), best first
+        """
+        top_rows = rows[_top_k(self.rank_scores(query, rows), k)]
+        scores = self.scores(query, top_rows)
+        order = np.argsort(-scores)
+        return top_rows[order], scores[order]
+    
+    def has_above(self, query: np.ndarray, threshold: float, early_abort_rows: int) -> bool:
+        """Whether any row's similarity with query reaches threshold."""
+        if len(self) >= early_abort_rows:
+            return _any_above(query, self.matrix, threshold)
+        return float(self.scores(query).max()) >= threshold
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent single-text embedding requests into batched encodes.
+    
+    Requests arriving within max_wait_ms of each other (up to max_batch)
+    share one model forward pass, run off the event loop.
+    """
+    
+    MAX_BATCH = 32
+    
+    def __init__(
+        self,
+        encode_batch: Callable[[List[str]], np.ndarray],
+        executor: Optional[Executor] = None,
+        max_batch: int = MAX_BATCH,
+        max_wait_ms: float = 5
+    ):
+        """
+        Args:
+            encode_batch: Blocking function embedding a list of texts
+            executor: Where to run encode_batch (default: the loop's executor)
+            max_batch: Maximum texts per forward pass
+            max_wait_ms: How long to wait for more requests to join a batch
+        """
+        self._encode_batch = encode_batch
+        self._executor = executor
+        self._max_batch = max_batch
+        self._max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+    
+    async def encode(self, text: str) -> np.ndarray:
+        """
+        Embed a single text as part of the next batch.
+        
+        Args:
+            text: Text to embed
+            
+        Returns:
+            Embedding vector
+        """
+        if self._worker is None or self._worker.done():
+            # Created lazily so the queue and task belong to the running loop
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+        
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((text, future))
+        return await future
+    
+    def _drain(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        """Move queued requests into the batch without waiting."""
+        while len(batch) < self._max_batch and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+    
+    async def _run(self) -> None:
+        """Collect requests into batches and resolve them with their vectors."""
+        while True:
+            batch = [await self._queue.get()]
+            self._drain(batch)
+            if len(batch) < self._max_batch:
+                await asyncio.sleep(self._max_wait)
+                self._drain(batch)
+            
+            try:
+                vectors = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self._encode_batch, [text for text, _ in batch]
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
 
 
 class MemoryService:
@@ -25,13 +384,33 @@ class MemoryService:
     Handles embedding storage, retrieval, and lifecycle.
     """
     
+    # Rooms at least this large use the blockwise early-abort duplicate scan
+    EARLY_ABORT_MIN_ROWS = 4096
+    
+    # Searches in rooms larger than this use Chroma's HNSW index; below it
+    # a linear scan of the in-memory cache is faster than graph traversal
+    LINEAR_SCAN_MAX_ROWS = 50_000
+    
+    # Other workers' writes evict a room's cached embeddings through the
+    # WebSocket relay; this only bounds staleness when an eviction is lost
+    ROOM_CACHE_TTL = 600
+    
+    # Threads for embedding and scoring; each ONNX/BLAS call is already
+    # multi-threaded across the cores, so more workers only oversubscribe
+    CPU_WORKERS = 2
+    
     def __init__(self):
         """Initialize ChromaDB client and collection."""
         if not CHROMADB_AVAILABLE:
             print("⚠️ Memory service disabled - ChromaDB not available")
             self._client = None
             self._collection = None
-            self._embedding_model = None
+            self._batcher = None
+            self._executor = None
+            self._room_cache = {}
+            self._room_loads = {}
+            self._room_generations = Counter()
+            self._emotion_heaps = {}
             return
             
         # Initialize ChromaDB client (Cloud or Local)
@@ -48,33 +427,187 @@ class MemoryService:
                 path=settings.chroma_persist_directory
             )
         
+        # Embeddings are stored L2-normalized, so inner product equals cosine
+        # without per-comparison norms (existing collections keep their space).
+        # The graph is kept lean: most searches are served by linear scan.
         self._collection = self._client.get_or_create_collection(
             name=settings.chroma_collection_name,
-            metadata={"hnsw:space": "cosine"}
+            metadata={
+                "hnsw:space": "ip",
+                "hnsw:construction_ef": 40,
+                "hnsw:M": 8,
+                "hnsw:search_ef": 32,
+            }
+        )
+        
+        # Embedding and scoring run here instead of on the event loop
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.CPU_WORKERS,
+            thread_name_prefix="memory"
+        )
+        self._batcher = EmbeddingBatcher(self._generate_embedding, self._executor)
+        # room_id -> embeddings warmed from Chroma for exact in-process scoring
+        self._room_cache: Dict[int, RoomVectors] = {}
+        # room_id -> in-flight load shared by concurrent cache misses
+        self._room_loads: Dict[int, asyncio.Future] = {}
+        # room_id -> bumped on every eviction; a load that started under an
+        # older generation may have missed a write and is not cached
+        self._room_generations: Counter = Counter()
+        # room_id -> min-heap of (epoch ns, id) for EMOTION memories
+        self._emotion_heaps: Dict[int, List[Tuple[int, str]]] = {}
+        connection_manager.on_evict("memory", self._drop_vectors)
+    
+    def _generate_embedding(self, text: Union[str, List[str]]) -> np.ndarray:
+        """
+        Generate embeddings for one text or a batch of texts.
+        
+        Args:
+            text: Text to embed, or a list of texts encoded together
+            
+        Returns:
+            Embedding vector, or a (len(text), dim) matrix for a list
+        """
+        model = _load_embedding_model(
+            settings.embedding_model,
+            settings.embedding_backend,
+            settings.embedding_onnx_file
+        )
+        return model.encode(
+            text,
+            # A whole coalesced batch in one forward pass
+            batch_size=EmbeddingBatcher.MAX_BATCH,
+            convert_to_numpy=True,
+            normalize_embeddings=True
         )
+    
+    async def _embed(self, text: str) -> np.ndarray:
+        """Embed one text, batched with concurrent requests."""
+        return await self._batcher.encode(text)
+    
+    async def _run_cpu(self, func: Callable, *args) -> Any:
+        """Run blocking numeric work or Chroma I/O on the memory thread pool."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+    
+    def _cached_vectors(self, room_id: int) -> Optional[RoomVectors]:
+        """Get a room's cached embeddings if they are younger than ROOM_CACHE_TTL."""
+        vectors = self._room_cache.get(room_id)
+        if vectors is not None and time.monotonic() - vectors.loaded_at < self.ROOM_CACHE_TTL:
+            return vectors
+        return None
+    
+    def _drop_vectors(self, room_id: int) -> None:
+        """Forget a room's cached embeddings and any load still in flight."""
+        self._room_cache.pop(room_id, None)
+        self._emotion_heaps.pop(room_id, None)
+        self._room_generations[room_id] += 1
+    
+    def _cache_current(self, room_id: int, vectors: Optional[RoomVectors]) -> bool:
+        """
+        Whether a finished write can be applied to vectors in place.
+        
+        While the write was awaited the entry may have been evicted or a
+        reload started; the cache is then dropped so that no load that
+        could have missed the write gets stored.
         
-        self._embedding_model = None
+        Args:
+            room_id: Room identifier
+            vectors: The cache entry resolved before the write
+            
+        Returns:
+            True if vectors is still the room's cache entry
+        """
+        if self._room_cache.get(room_id) is vectors and room_id not in self._room_loads:
+            return True
+        self._drop_vectors(room_id)
+        return False
     
-    def _get_embedding_model(self):
-        """Lazy load embedding model."""
-        if self._embedding_model is None:
-            from sentence_transformers import SentenceTransformer
-            self._embedding_model = SentenceTransformer(settings.embedding_model)
-        return self._embedding_model
+    def _evict_elsewhere(self, room_id: int) -> None:
+        """Tell the other workers a room's memories changed."""
+        connection_manager.publish_evict("memory", room_id)
     
-    def _generate_embedding(self, text: str) -> List[float]:
+    async def _room_vectors(self, room_id: int) -> RoomVectors:
         """
-        Generate embedding for text.
+        Get a room's cached embeddings, loading them from Chroma on the
+        memory thread pool when missing. Concurrent misses share one load.
         
         Args:
-            text: Text to embed
+            room_id: Room identifier
+            
+        Returns:
+            The room's RoomVectors
+        """
+        vectors = self._cached_vectors(room_id)
+        if vectors is not None:
+            return vectors
+        
+        load = self._room_loads.get(room_id)
+        if load is None:
+            load = asyncio.ensure_future(self._load_vectors(room_id))
+            self._room_loads[room_id] = load
+        # Shielded so a cancelled caller doesn't cancel the shared load
+        return await asyncio.shield(load)
+    
+    async def _load_vectors(self, room_id: int) -> RoomVectors:
+        """Load a room's embeddings and cache them unless evicted meanwhile."""
+        generation = self._room_generations[room_id]
+        try:
+            vectors = await self._run_cpu(self._fetch_vectors, room_id)
+        finally:
+            self._room_loads.pop(room_id, None)
+        
+        if self._room_generations[room_id] == generation:
+            self._room_cache[room_id] = vectors
+            # The heap is derived from the cache and is rebuilt with it
+            self._emotion_heaps.pop(room_id, None)
+        return vectors
+    
+    def _fetch_vectors(self, room_id: int) -> RoomVectors:
+        """Read a room's rows from Chroma into a RoomVectors (blocking)."""
+        results = self._collection.get(
+            where={"room_id": room_id},
+            include=["embeddings", "metadatas", "documents"]
+        )
+        return RoomVectors(
+            results['ids'],
+            results['embeddings'],
+            results['metadatas'],
+            results['documents']
+        )
+    
+    async def _emotion_heap(self, room_id: int) -> List[Tuple[int, str]]:
+        """
+        Get a room's EMOTION memories as a min-heap, oldest first.
+        
+        Warmed from the room cache on first use and kept in step with
+        add_memory until the room cache is next reloaded.
+        
+        Args:
+            room_id: Room identifier
             
         Returns:
-            Embedding vector as list of floats
+            Heap of (epoch nanoseconds, memory id)
         """
-        model = self._get_embedding_model()
-        embedding = model.encode(text, convert_to_numpy=True)
-        return embedding.tolist()
+        # Resolve the cache first: a reload drops the stale heap
+        vectors = await self._room_vectors(room_id)
+        heap = self._emotion_heaps.get(room_id)
+        if heap is None:
+            heap = [
+                (_ts_ns(vectors.metadatas[i]), vectors.ids[i])
+                for i in vectors.rows_in_category(MemoryCategory.EMOTION)
+            ]
+            heapq.heapify(heap)
+            self._emotion_heaps[room_id] = heap
+        return heap
+    
+    async def _delete_ids(self, room_id: int, ids: List[str]) -> None:
+        """Delete memories from Chroma and the room cache."""
+        vectors = self._room_cache.get(room_id)
+        await self._run_cpu(functools.partial(self._collection.delete, ids=ids))
+        if self._cache_current(room_id, vectors) and vectors is not None:
+            vectors.remove(ids)
+        # Rebuilt lazily; deletions outside the EMOTION rule are rare
+        self._emotion_heaps.pop(room_id, None)
+        self._evict_elsewhere(room_id)
     
     async def add_memory(
         self,
@@ -99,14 +632,14 @@ class MemoryService:
         Returns:
             Created memory entry
         """
+        # Embed once; reused for dedupe, category rules, and storage
+        embedding = await self._embed(text)
+        
         # Check for duplicates using similarity
-        is_duplicate = await self._check_duplicate(room_id, text)
+        is_duplicate = await self._check_duplicate(room_id, text, embedding)
         if is_duplicate:
             raise ValueError("Similar memory already exists")
         
-        # Generate embedding
-        embedding = self._generate_embedding(text)
-        
         # Create entry
         entry = MemoryEntry(
             id=str(uuid.uuid4()),
@@ -120,49 +653,67 @@ class MemoryService:
         )
         
         # Handle category-specific rules
-        await self._apply_category_rules(room_id, category, text)
+        await self._apply_category_rules(room_id, category, text, embedding)
+        
+        # Resolve the cache before writing, so a reload can't pick up the
+        # new row and then have it appended a second time
+        vectors = await self._room_vectors(room_id)
+        heap = await self._emotion_heap(room_id) if category == MemoryCategory.EMOTION else None
         
         # Add to ChromaDB
-        self._collection.add(
+        chroma_metadata = entry.to_chroma_metadata()
+        await self._run_cpu(functools.partial(
+            self._collection.add,
             ids=[entry.id],
-            embeddings=[embedding],
+            embeddings=[embedding.tolist()],
             documents=[text],
-            metadatas=[entry.to_chroma_metadata()]
-        )
+            metadatas=[chroma_metadata]
+        ))
+        if self._cache_current(room_id, vectors):
+            vectors.append(entry.id, embedding, chroma_metadata, text)
+            if heap is not None:
+                heapq.heappush(heap, (chroma_metadata['ts_ns'], entry.id))
+        self._evict_elsewhere(room_id)
         
         return entry
     
-    async def _check_duplicate(self, room_id: int, text: str) -> bool:
+    async def _check_duplicate(
+        self,
+        room_id: int,
+        text: str,
+        embedding: Optional[np.ndarray] = None
+    ) -> bool:
         """
         Check if similar memory already exists.
         
         Args:
             room_id: Room identifier
             text: Text to check
+            embedding: Precomputed embedding of text, if available
             
         Returns:
             True if duplicate found
         """
-        embedding = self._generate_embedding(text)
-        
-        results = self._collection.query(
-            query_embeddings=[embedding],
-            n_results=1,
-            where={"room_id": room_id}
-        )
+        vectors = await self._room_vectors(room_id)
+        if not len(vectors):
+            return False
         
-        if results['distances'] and results['distances'][0]:
-            # Cosine distance, lower is more similar
-            similarity = 1 - results['distances'][0][0]
-            return similarity >= settings.cosine_similarity_threshold
+        if embedding is None:
+            embedding = await self._embed(text)
         
-        return False
+        return await self._run_cpu(
+            vectors.snapshot().has_above,
+            embedding,
+            settings.cosine_similarity_threshold,
+            self.EARLY_ABORT_MIN_ROWS
+        )
     
     async def _apply_category_rules(
         self,
         room_id: int,
         category: MemoryCategory,
-        text: str
+        text: str,
+        embedding: Optional[np.ndarray] = None
     ) -> None:
         """
         Apply category-specific memory management rules.
@@ -173,53 +724,38 @@ class MemoryService:
         - EMOTION: Keep last 10
         """
         if category == MemoryCategory.EMOTION:
-            # Keep only last 10 emotional memories
-            results = self._collection.get(
-                where={
-                    "$and": [
-                        {"room_id": room_id},
-                        {"category": MemoryCategory.EMOTION.value}
-                    ]
-                }
-            )
+            # Keep only last 10 emotional memories: pop the oldest off the heap
+            heap = await self._emotion_heap(room_id)
+            vectors = self._room_cache.get(room_id)
+            to_delete = []
+            while len(heap) >= 10:
+                to_delete.append(heapq.heappop(heap)[1])
             
-            if results['ids'] and len(results['ids']) >= 10:
-                # Sort by timestamp and remove oldest
-                entries = list(zip(
-                    results['ids'],
-                    results['metadatas']
-                ))
-                entries.sort(key=lambda x: x[1].get('timestamp', ''), reverse=True)
-                
-                # Delete entries beyond limit
-                to_delete = [e[0] for e in entries[9:]]
-                if to_delete:
-                    self._collection.delete(ids=to_delete)
+            if to_delete:
+                await self._run_cpu(functools.partial(self._collection.delete, ids=to_delete))
+                if self._cache_current(room_id, vectors) and vectors is not None:
+                    vectors.remove(to_delete)
+                self._evict_elsewhere(room_id)
         
         elif category == MemoryCategory.PREFERENCE:
             # Find and remove similar preferences
-            embedding = self._generate_embedding(text)
+            vectors = await self._room_vectors(room_id)
+            if not vectors.category_counts[category.value]:
+                return
+            if embedding is None:
+                embedding = await self._embed(text)
             
-            results = self._collection.query(
-                query_embeddings=[embedding],
-                n_results=5,
-                where={
-                    "$and": [
-                        {"room_id": room_id},
-                        {"category": MemoryCategory.PREFERENCE.value}
-                    ]
-                }
-            )
+            vectors = vectors.snapshot()
+            rows = vectors.rows_in_category(category)
+            scores = await self._run_cpu(vectors.scores, embedding, rows)
+            to_delete = [
+                vectors.ids[rows[i]]
+                for i in _top_k(scores, 5)
+                if scores[i] >= 0.7  # Similar preference threshold
+            ]
             
-            if results['ids'] and results['distances']:
-                to_delete = []
-                for i, (id_, dist) in enumerate(zip(results['ids'][0], results['distances'][0])):
-                    similarity = 1 - dist
-                    if similarity >= 0.7:  # Similar preference threshold
-                        to_delete.append(id_)
-                
-                if to_delete:
-                    self._collection.delete(ids=to_delete)
+            if to_delete:
+                await self._delete_ids(room_id, to_delete)
     
     async def search_memories(
         self,
@@ -240,8 +776,82 @@ class MemoryService:
         Returns:
             List of matching memories
         """
-        embedding = self._generate_embedding(query)
+        if not await self._has_candidates(room_id, category) or limit < 1:
+            return []
+        
+        embedding = await self._embed(query)
+        return await self.search_memories_by_vector(room_id, embedding, limit, category)
+    
+    async def _has_candidates(self, room_id: int, category: Optional[MemoryCategory]) -> bool:
+        """Whether a room has any memories to search, so embedding can be skipped."""
+        vectors = await self._room_vectors(room_id)
+        return bool(len(vectors) if category is None else vectors.category_counts[category.value])
+    
+    async def search_memories_by_vector(
+        self,
+        room_id: int,
+        embedding: np.ndarray,
+        limit: int = 10,
+        category: Optional[MemoryCategory] = None
+    ) -> List[MemorySearchResult]:
+        """
+        Search memories with an already computed, unit-norm query vector.
+        
+        Args:
+            room_id: Room identifier
+            embedding: Normalized query embedding
+            limit: Maximum results
+            category: Optional category filter
+            
+        Returns:
+            List of matching memories
+        """
+        vectors = await self._room_vectors(room_id)
+        if len(vectors) > self.LINEAR_SCAN_MAX_ROWS:
+            return await self._run_cpu(self._query_index, room_id, embedding, limit, category)
         
+        vectors = vectors.snapshot()
+        rows = vectors.rows_in_category(category)
+        if not len(rows) or limit < 1:
+            return []
+        
+        # Rank on int8, then report exact similarity for the winners
+        top_rows, scores = await self._run_cpu(vectors.search, embedding, rows, limit)
+        
+        memories = []
+        for row, score in zip(top_rows, scores):
+            meta = vectors.metadatas[row]
+            
+            memories.append(MemorySearchResult(
+                memory_id=vectors.ids[row],
+                text=vectors.documents[row],
+                category=MemoryCategory(meta.get('category', 'general')),
+                similarity=float(score),
+                timestamp=datetime.fromisoformat(meta.get('timestamp', datetime.utcnow().isoformat())),
+                sender_id=meta.get('sender_id', '')
+            ))
+        
+        return memories
+    
+    def _query_index(
+        self,
+        room_id: int,
+        embedding: np.ndarray,
+        limit: int,
+        category: Optional[MemoryCategory] = None
+    ) -> List[MemorySearchResult]:
+        """
+        Search a large room through Chroma's HNSW index (blocking).
+        
+        Args:
+            room_id: Room identifier
+            embedding: Normalized query embedding
+            limit: Maximum results
+            category: Optional category filter
+            
+        Returns:
+            List of matching memories
+        """
         where_filter: Dict[str, Any] = {"room_id": room_id}
         if category:
             where_filter = {
@@ -252,27 +862,28 @@ class MemoryService:
             }
         
         results = self._collection.query(
-            query_embeddings=[embedding],
+            query_embeddings=[embedding.tolist()],
             n_results=limit,
             where=where_filter,
             include=["documents", "metadatas", "distances"]
         )
         
         memories = []
-        if results['ids'] and results['ids'][0]:
-            for i, id_ in enumerate(results['ids'][0]):
-                doc = results['documents'][0][i] if results['documents'] else ""
-                meta = results['metadatas'][0][i] if results['metadatas'] else {}
-                dist = results['distances'][0][i] if results['distances'] else 1.0
-                
-                memories.append(MemorySearchResult(
-                    id=id_,
-                    text=doc,
-                    category=MemoryCategory(meta.get('category', 'general')),
-                    similarity_score=1 - dist,
-                    timestamp=datetime.fromisoformat(meta.get('timestamp', datetime.utcnow().isoformat())),
-                    sender_id=meta.get('sender_id', '')
-                ))
+        for id_, doc, meta, distance in zip(
+            results['ids'][0],
+            results['documents'][0],
+            results['metadatas'][0],
+            results['distances'][0]
+        ):
+            memories.append(MemorySearchResult(
+                memory_id=id_,
+                text=doc,
+                category=MemoryCategory(meta.get('category', 'general')),
+                # Both "ip" and "cosine" spaces report 1 - similarity for unit vectors
+                similarity=1 - distance,
+                timestamp=datetime.fromisoformat(meta.get('timestamp', datetime.utcnow().isoformat())),
+                sender_id=meta.get('sender_id', '')
+            ))
         
         return memories
     
@@ -296,10 +907,19 @@ class MemoryService:
         if not recent_messages:
             return []
         
-        # Combine recent messages for context query
-        context_text = " ".join(recent_messages[-5:])  # Last 5 messages
+        if not await self._has_candidates(room_id, None) or limit < 1:
+            return []
+        
+        # Embed the last 5 messages in one batch rather than as one joined
+        # string (which the tokenizer would truncate), then query with their
+        # recency-weighted centroid
+        recent = recent_messages[-5:]
+        vectors = await self._run_cpu(self._generate_embedding, recent)
+        weights = np.linspace(0.1, 0.3, 5, dtype=np.float32)[-len(recent):]
+        centroid = weights @ vectors
+        centroid /= np.linalg.norm(centroid) or 1
         
-        return await self.search_memories(room_id, context_text, limit)
+        return await self.search_memories_by_vector(room_id, centroid, limit)
     
     async def get_room_memories(
         self,
@@ -325,10 +945,11 @@ class MemoryService:
                 ]
             }
         
-        results = self._collection.get(
+        results = await self._run_cpu(functools.partial(
+            self._collection.get,
             where=where_filter,
             include=["documents", "metadatas"]
-        )
+        ))
         
         memories = []
         if results['ids']:
@@ -360,10 +981,20 @@ class MemoryService:
             True if deleted
         """
         try:
-            self._collection.delete(ids=[memory_id])
-            return True
+            # The room id is needed to evict the room on the other workers
+            found = await self._run_cpu(functools.partial(
+                self._collection.get, ids=[memory_id], include=["metadatas"]
+            ))
+            await self._run_cpu(functools.partial(self._collection.delete, ids=[memory_id]))
         except Exception:
             return False
+        
+        for meta in found['metadatas'] or []:
+            room_id = meta.get('room_id')
+            if room_id is not None:
+                self._drop_vectors(room_id)
+                self._evict_elsewhere(room_id)
+        return True
     
     async def clear_room_memories(self, room_id: int) -> int:
         """
@@ -375,16 +1006,23 @@ class MemoryService:
         Returns:
             Number of deleted memories
         """
-        results = self._collection.get(
-            where={"room_id": room_id}
-        )
+        # Chroma's delete doesn't report a count; a fresh room cache already
+        # knows it, otherwise fetch ids only (no documents/metadata)
+        vectors = self._cached_vectors(room_id)
+        if vectors is not None:
+            count = len(vectors)
+        else:
+            results = await self._run_cpu(functools.partial(
+                self._collection.get, where={"room_id": room_id}, include=[]
+            ))
+            count = len(results['ids'] or [])
         
-        if results['ids']:
-            count = len(results['ids'])
-            self._collection.delete(ids=results['ids'])
-            return count
+        if count:
+            await self._run_cpu(functools.partial(self._collection.delete, where={"room_id": room_id}))
+        self._drop_vectors(room_id)
+        self._evict_elsewhere(room_id)
         
-        return 0
+        return count
     
     async def get_memory_stats(self, room_id: int) -> Dict[str, int]:
         """
@@ -396,18 +1034,8 @@ class MemoryService:
         Returns:
             Dict with category counts
         """
-        results = self._collection.get(
-            where={"room_id": room_id},
-            include=["metadatas"]
-        )
-        
-        stats = {cat.value: 0 for cat in MemoryCategory}
-        
-        if results['metadatas']:
-            for meta in results['metadatas']:
-                cat = meta.get('category', 'general')
-                if cat in stats:
-                    stats[cat] += 1
+        counts = (await self._room_vectors(room_id)).category_counts
+        stats = {cat.value: counts[cat.value] for cat in MemoryCategory}
         
         stats['total'] = sum(stats.values())
         return stats
@@ -5,8 +5,10 @@ Handles message creation, retrieval, reactions, and media.
 
 import uuid
 from datetime import datetime
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, AsyncIterator
 import base64
+from cachetools import TTLCache
+from pydantic import TypeAdapter
 
 from config import settings
 from core.encryption import get_encryption_service
@@ -17,12 +19,49 @@ from models.message import (
     ReactionType, Reaction, ChatHistory
 )
 
+# Validates a whole result set in one pydantic-core call instead of
+# one Python-level Message(**row) per row
+_message_list = TypeAdapter(List[Message])
+
 
 class MessageService:
     """Service for message operations."""
     
     TABLE_MESSAGES = "messages"
     TABLE_REACTIONS = "reactions"
+    HISTORY_PAGE_SIZE = 100
+    MESSAGE_CACHE_SIZE = 10_000
+    MESSAGE_CACHE_TTL = 300  # seconds
+    
+    def __init__(self):
+        """Initialize message service."""
+        # message_id -> Message for recently read messages
+        self._msg_cache: TTLCache = TTLCache(
+            maxsize=self.MESSAGE_CACHE_SIZE,
+            ttl=self.MESSAGE_CACHE_TTL
+        )
+    
+    def _invalidate_message(self, message_id: str) -> None:
+        """Drop a message from the read cache after it changes."""
+        self._msg_cache.pop(message_id, None)
+    
+    def _cache_message(self, message: Message) -> None:
+        """Cache a private copy, so callers mutating theirs can't corrupt it."""
+        self._msg_cache[message.id] = message.model_copy(deep=True)
+    
+    def forget_room_messages(self, room_id: int) -> None:
+        """
+        Drop a room's messages from the read cache.
+        
+        Used when rows go away without passing through this service,
+        e.g. ON DELETE CASCADE from a hard-deleted room.
+        
+        Args:
+            room_id: Room identifier
+        """
+        stale = [mid for mid, message in list(self._msg_cache.items()) if message.room_id == room_id]
+        for message_id in stale:
+            self._invalidate_message(message_id)
     
     async def create_message(self, data: MessageCreate) -> Message:
         """
@@ -51,7 +90,7 @@ class MessageService:
         }
         
         result = await supabase.insert(self.TABLE_MESSAGES, message_data)
-        return Message(**result)
+        return Message.model_validate(result)
     
     async def create_bot_message(
         self,
@@ -85,7 +124,7 @@ class MessageService:
         }
         
         result = await supabase.insert(self.TABLE_MESSAGES, message_data)
-        return Message(**result)
+        return Message.model_validate(result)
     
     async def get_message(self, message_id: str) -> Optional[Message]:
         """
@@ -97,13 +136,19 @@ class MessageService:
         Returns:
             Message or None
         """
+        cached = self._msg_cache.get(message_id)
+        if cached is not None:
+            return cached.model_copy(deep=True)
+        
         result = await supabase.select(
             self.TABLE_MESSAGES,
             filters={"id": message_id}
         )
         
         if result:
-            return Message(**result[0])
+            message = Message.model_validate(result[0])
+            self._cache_message(message)
+            return message
         return None
     
     async def get_room_messages(
@@ -137,7 +182,7 @@ class MessageService:
         if has_more:
             messages_data = messages_data[:limit]
         
-        messages = [Message(**m) for m in messages_data]
+        messages = _message_list.validate_python(messages_data)
         messages.reverse()  # Oldest first
         
         public_messages = [MessagePublic.from_message(m) for m in messages]
@@ -148,6 +193,121 @@ class MessageService:
             oldest_timestamp=messages[0].created_at if messages else None
         )
     
+    async def get_history_window(
+        self,
+        room_id: int,
+        limit: int = 50,
+        before_timestamp: Optional[datetime] = None
+    ) -> Tuple[Optional[Tuple[str, str]], bool]:
+        """
+        Locate the start of a history page without fetching message bodies.
+        
+        Args:
+            room_id: Room identifier
+            limit: Maximum messages in the page
+            before_timestamp: Page ends before this time
+            
+        Returns:
+            Tuple of ((created_at, id) of the oldest message in the page, or
+            None if the page reaches the start of the room; has_more)
+        """
+        if limit < 1:
+            return None, False
+        
+        query = supabase.table(self.TABLE_MESSAGES).select("created_at,id").eq("room_id", room_id)
+        
+        if before_timestamp:
+            query = query.lt("created_at", before_timestamp.isoformat())
+        
+        # Rows limit-1 and limit: the page's oldest message and the first one past it
+        result = (
+            query.order("created_at", desc=True)
+            .order("id", desc=True)
+            .range(limit - 1, limit)
+            .execute()
+        )
+        rows = result.data or []
+        
+        if not rows:
+            return None, False
+        
+        return (rows[0]["created_at"], rows[0]["id"]), len(rows) > 1
+    
+    async def get_history_page(
+        self,
+        room_id: int,
+        size: int,
+        before_timestamp: Optional[datetime] = None,
+        start: Optional[Tuple[str, str]] = None,
+        after: Optional[Tuple[str, str]] = None
+    ) -> Tuple[List[MessagePublic], Optional[Tuple[str, str]]]:
+        """
+        Fetch one history page oldest-first, keyset-paged on (created_at, id).
+        
+        Unlike offset paging, rows inserted between pages can't shift the
+        page boundaries, so nothing is skipped or repeated on ties.
+        
+        Args:
+            room_id: Room identifier
+            size: Maximum messages to fetch
+            before_timestamp: Only messages before this time
+            start: Only messages at or after this (created_at, id)
+            after: Only messages strictly after this (created_at, id)
+            
+        Returns:
+            Tuple of (messages, (created_at, id) of the last row or None)
+        """
+        query = supabase.table(self.TABLE_MESSAGES).select("*").eq("room_id", room_id)
+        
+        bound, op = (start, "gte") if start else (after, "gt")
+        if bound:
+            created_at, message_id = bound
+            query = query.or_(
+                f'created_at.gt."{created_at}",'
+                f'and(created_at.eq."{created_at}",id.{op}.{message_id})'
+            )
+        if before_timestamp:
+            query = query.lt("created_at", before_timestamp.isoformat())
+        
+        result = query.order("created_at").order("id").limit(size).execute()
+        rows = result.data or []
+        
+        last = (rows[-1]["created_at"], rows[-1]["id"]) if rows else None
+        messages = [MessagePublic.from_message(m) for m in _message_list.validate_python(rows)]
+        return messages, last
+    
+    async def iter_room_messages(
+        self,
+        room_id: int,
+        limit: int,
+        before_timestamp: Optional[datetime] = None,
+        after: Optional[Tuple[str, str]] = None
+    ) -> AsyncIterator[MessagePublic]:
+        """
+        Iterate history oldest-first, fetching HISTORY_PAGE_SIZE rows at a time.
+        
+        Args:
+            room_id: Room identifier
+            limit: Maximum messages to yield
+            before_timestamp: Only messages before this time
+            after: Only messages strictly after this (created_at, id)
+            
+        Yields:
+            Public messages, oldest first
+        """
+        while limit > 0:
+            size = min(self.HISTORY_PAGE_SIZE, limit)
+            page, after = await self.get_history_page(
+                room_id, size, before_timestamp, after=after
+            )
+            
+            for message in page:
+                yield message
+            
+            if len(page) < size:
+                break
+            limit -= size
+    
     async def get_recent_messages(
         self,
         room_id: int,
@@ -171,7 +331,7 @@ class MessageService:
             limit=limit
         )
         
-        messages = [Message(**m) for m in result]
+        messages = _message_list.validate_python(result)
         messages.reverse()
         return messages
     
@@ -192,26 +352,22 @@ class MessageService:
         Returns:
             Updated message
         """
-        message = await self.get_message(message_id)
-        if not message:
+        # One atomic UPDATE in Postgres; no read and no lost updates
+        self._invalidate_message(message_id)
+        try:
+            rows = await supabase.rpc("add_message_reaction", {
+                "p_message_id": message_id,
+                "p_reaction": reaction_type.value,
+                "p_user_id": user_id
+            })
+        finally:
+            # Also drop anything a concurrent reader cached mid-write
+            self._invalidate_message(message_id)
+        if not rows:
             raise ValueError("Message not found")
         
-        reactions = message.reactions.copy()
-        reaction_key = reaction_type.value
-        
-        if reaction_key not in reactions:
-            reactions[reaction_key] = []
-        
-        if user_id not in reactions[reaction_key]:
-            reactions[reaction_key].append(user_id)
-        
-        await supabase.update(
-            self.TABLE_MESSAGES,
-            {"reactions": reactions, "updated_at": datetime.utcnow().isoformat()},
-            {"id": message_id}
-        )
-        
-        message.reactions = reactions
+        message = Message.model_validate(rows[0])
+        self._cache_message(message)
         return message
     
     async def remove_reaction(
@@ -231,25 +387,21 @@ class MessageService:
         Returns:
             Updated message
         """
-        message = await self.get_message(message_id)
-        if not message:
+        self._invalidate_message(message_id)
+        try:
+            rows = await supabase.rpc("remove_message_reaction", {
+                "p_message_id": message_id,
+                "p_reaction": reaction_type.value,
+                "p_user_id": user_id
+            })
+        finally:
+            # Also drop anything a concurrent reader cached mid-write
+            self._invalidate_message(message_id)
+        if not rows:
             raise ValueError("Message not found")
         
-        reactions = message.reactions.copy()
-        reaction_key = reaction_type.value
-        
-        if reaction_key in reactions and user_id in reactions[reaction_key]:
-            reactions[reaction_key].remove(user_id)
-            if not reactions[reaction_key]:
-                del reactions[reaction_key]
-        
-        await supabase.update(
-            self.TABLE_MESSAGES,
-            {"reactions": reactions, "updated_at": datetime.utcnow().isoformat()},
-            {"id": message_id}
-        )
-        
-        message.reactions = reactions
+        message = Message.model_validate(rows[0])
+        self._cache_message(message)
         return message
     
     async def view_once_message(
@@ -287,13 +439,12 @@ class MessageService:
             
             if message.media_encrypted:
                 encryption = get_encryption_service()
-                decrypted = encryption.decrypt_from_base64(
-                    encrypted_data.decode('utf-8')
-                )
+                decrypted = encryption.decrypt_from_bytes(encrypted_data)
             else:
                 decrypted = encrypted_data
             
             # Mark as viewed
+            self._invalidate_message(message_id)
             await supabase.update(
                 self.TABLE_MESSAGES,
                 {
@@ -302,6 +453,7 @@ class MessageService:
                 },
                 {"id": message_id}
             )
+            self._invalidate_message(message_id)
             
             # Delete from storage after viewing
             await supabase.delete_file([message.media_url])
@@ -348,12 +500,12 @@ class MessageService:
         
         # Encrypt media
         encryption = get_encryption_service()
-        encrypted_data = encryption.encrypt_to_base64(content)
+        encrypted_data = encryption.encrypt_to_bytes(content)
         
         # Upload to storage
         await supabase.upload_file(
             storage_path,
-            encrypted_data.encode('utf-8'),
+            encrypted_data,
             "application/octet-stream"
         )
         
@@ -384,6 +536,7 @@ class MessageService:
             {"id": message_id}
         )
         
+        self._invalidate_message(message_id)
         return await self.get_message(message_id)
     
     async def delete_room_messages(self, room_id: int) -> int:
@@ -396,19 +549,13 @@ class MessageService:
         Returns:
             Number of deleted messages
         """
-        # Get message count first
-        messages = await supabase.select(
-            self.TABLE_MESSAGES,
-            columns="id",
-            filters={"room_id": room_id}
-        )
-        
-        count = len(messages)
+        # Single DELETE ... RETURNING id; only the ids cross the wire
+        deleted_ids = await supabase.rpc("delete_room_messages", {"p_room_id": room_id}) or []
         
-        # Delete messages
-        await supabase.delete(self.TABLE_MESSAGES, {"room_id": room_id})
+        for message_id in deleted_ids:
+            self._invalidate_message(message_id)
         
-        return count
+        return len(deleted_ids)
     
     async def check_content_safety(self, content: str) -> ContentCategory:
         """
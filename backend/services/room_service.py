@@ -3,18 +3,26 @@ Room service for managing chat rooms.
 Handles room creation, joining, and lifecycle management.
 """
 
-import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional, Tuple
+from cachetools import TTLCache
 
 from config import settings
+from core.request_scope import request_scope
 from core.security import SecurityService, security_service
 from core.supabase_client import supabase
+from services.message_service import message_service
+from ws.connection_manager import connection_manager
 from models.room import (
     Room, RoomCreate, RoomJoin, RoomPublic, RoomStatus, 
     NSFWMode, ConsentStatus, RoomSettings, RoomOnboarding
 )
-from models.user import UserInRoom, UserRole, UserPublic
+from models.user import UserInRoom, UserPublic
+
+
+def _utcnow_iso() -> str:
+    """Current UTC time as an ISO-8601 string with offset."""
+    return datetime.now(timezone.utc).isoformat()
 
 
 class RoomService:
@@ -22,8 +30,33 @@ class RoomService:
     
     TABLE_ROOMS = "rooms"
     TABLE_USERS = "room_users"
+    ROOM_CACHE_SIZE = 10_000
+    ROOM_CACHE_TTL = 30  # seconds
+    # RoomOnboarding fields stored as rooms columns
+    ONBOARDING_COLUMNS = {"relationship_type", "anniversary_date"}
+    
+    def __init__(self):
+        # Room rows are read on nearly every operation but rarely written;
+        # every write goes through _forget_room
+        self._room_cache: TTLCache = TTLCache(
+            maxsize=self.ROOM_CACHE_SIZE,
+            ttl=self.ROOM_CACHE_TTL
+        )
+        # name -> room_id, resolved through _room_cache
+        self._room_names: TTLCache = TTLCache(
+            maxsize=self.ROOM_CACHE_SIZE,
+            ttl=self.ROOM_CACHE_TTL
+        )
+        # Writes on other workers evict here through the WebSocket relay
+        connection_manager.on_evict("room", self._drop_room)
     
-    async def create_room(self, data: RoomCreate) -> Tuple[Room, str, UserInRoom]:
+    def _remember_room(self, room: Room) -> None:
+        """Store a private copy of a freshly read room in the read cache."""
+        self._room_cache[room.id] = room.model_copy(deep=True)
+        if room.name:
+            self._room_names[room.name] = room.id
+    
+    async def create_room(self, data: RoomCreate) -> Tuple[RoomPublic, str, UserInRoom]:
         """
         Create a new chat room and add creator as first user.
         
@@ -31,42 +64,23 @@ class RoomService:
             data: Room creation data
             
         Returns:
-            Tuple of (Room, plain_secret, UserInRoom)
+            Tuple of (RoomPublic, plain_secret, UserInRoom)
         """
         # Generate or use provided secret
         plain_secret = data.room_secret or security_service.generate_room_secret()
         secret_hash = security_service.hash_secret(plain_secret)
         
-        room_data = {
-            "name": data.name,
-            "secret_hash": secret_hash,
-            "status": RoomStatus.ACTIVE.value,
-            "nsfw_mode": NSFWMode.DISABLED.value,
-            "partner_a_nsfw_consent": False,
-            "partner_b_nsfw_consent": False,
-            "created_at": datetime.utcnow().isoformat(),
-        }
-        
-        result = await supabase.insert(self.TABLE_ROOMS, room_data)
-        room = Room(**result)
-        
-        # Create the first user (room creator)
-        user_data = {
-            "id": str(uuid.uuid4()),
-            "room_id": room.id,
-            "nickname": data.creator_nickname,
-            "device_id": data.device_id,
-            "role": UserRole.PARTNER_A.value,
-            "is_online": True,
-            "last_seen": datetime.utcnow().isoformat(),
-            "created_at": datetime.utcnow().isoformat(),
-            "nsfw_consent": False,
-        }
-        
-        user_result = await supabase.insert(self.TABLE_USERS, user_data)
-        user = UserInRoom(**user_result)
-        
-        return room, plain_secret, user
+        # Room and creator are inserted in one transaction (one round trip)
+        result = await supabase.rpc("create_room_atomic", {
+            "p_name": data.name,
+            "p_secret_hash": secret_hash,
+            "p_device_id": data.device_id,
+            "p_nickname": data.creator_nickname
+        })
+        room = Room(**result["room"])
+        user = UserInRoom(**result["user"])
+        
+        return self._to_public(room, [user]), plain_secret, user
     
     async def get_room(self, room_id: int) -> Optional[Room]:
         """
@@ -78,14 +92,42 @@ class RoomService:
         Returns:
             Room or None if not found
         """
-        result = await supabase.select(
-            self.TABLE_ROOMS,
-            filters={"id": room_id}
-        )
+        memo = request_scope()
+        key = ("room", room_id)
+        if memo is not None and key in memo:
+            return memo[key]
+        
+        room = self._room_cache.get(room_id)
+        if room is not None:
+            # Callers may mutate what they get; the cached copy stays intact
+            room = room.model_copy(deep=True)
+        else:
+            result = await supabase.select(
+                self.TABLE_ROOMS,
+                filters={"id": room_id}
+            )
+            if result:
+                room = Room(**result[0])
+                self._remember_room(room)
         
-        if result:
-            return Room(**result[0])
-        return None
+        if memo is not None:
+            memo[key] = room
+        return room
+    
+    def _drop_room(self, room_id: int) -> None:
+        """Drop a room from this worker's read cache."""
+        room = self._room_cache.pop(room_id, None)
+        if room is not None and room.name:
+            self._room_names.pop(room.name, None)
+    
+    def _forget_room(self, room_id: int) -> None:
+        """Drop a room from every worker's read cache and the request memo after it is written."""
+        self._drop_room(room_id)
+        connection_manager.publish_evict("room", room_id)
+        
+        memo = request_scope()
+        if memo is not None:
+            memo.pop(("room", room_id), None)
     
     async def get_room_by_name(self, name: str) -> Optional[Room]:
         """
@@ -97,16 +139,22 @@ class RoomService:
         Returns:
             Room or None if not found
         """
+        room_id = self._room_names.get(name)
+        if room_id is not None and room_id in self._room_cache:
+            return self._room_cache[room_id].model_copy(deep=True)
+        
         result = await supabase.select(
             self.TABLE_ROOMS,
             filters={"name": name}
         )
         
         if result:
-            return Room(**result[0])
+            room = Room(**result[0])
+            self._remember_room(room)
+            return room
         return None
     
-    async def join_room(self, data: RoomJoin) -> Tuple[UserInRoom, Room]:
+    async def join_room(self, data: RoomJoin) -> Tuple[UserInRoom, RoomPublic]:
         """
         Join an existing room by name.
         
@@ -114,73 +162,28 @@ class RoomService:
             data: Room join data with credentials
             
         Returns:
-            Tuple of (UserInRoom, Room)
+            Tuple of (UserInRoom, RoomPublic)
             
         Raises:
             ValueError: If room not found, invalid secret, or room full
         """
-        # Get room by name
-        room = await self.get_room_by_name(data.room_name)
-        if not room:
-            raise ValueError("Room not found")
-        
-        if room.status != RoomStatus.ACTIVE:
-            raise ValueError("Room is not active")
-        
-        # Verify secret
-        if not security_service.verify_secret(data.room_secret, room.secret_hash):
-            raise ValueError("Invalid room secret")
-        
-        # Check existing users
-        users = await self.get_room_users(room.id)
-        
-        # Check if device already has a user in this room
-        existing_user = next(
-            (u for u in users if u.device_id == data.device_id),
-            None
-        )
-        if existing_user:
-            # Update last seen and return existing user
-            await supabase.update(
-                self.TABLE_USERS,
-                {"last_seen": datetime.utcnow().isoformat(), "is_online": True},
-                {"id": existing_user.id}
-            )
-            existing_user.is_online = True
-            existing_user.last_seen = datetime.utcnow()
-            return existing_user, room
-        
-        # Check room capacity (max 2 users)
-        if len(users) >= 2:
-            raise ValueError("Room is full (maximum 2 users)")
-        
-        # Determine role
-        role = UserRole.PARTNER_A if len(users) == 0 else UserRole.PARTNER_B
-        
-        # Create user
-        user_data = {
-            "id": str(uuid.uuid4()),
-            "room_id": room.id,
-            "nickname": data.nickname,
-            "device_id": data.device_id,
-            "role": role.value,
-            "is_online": True,
-            "last_seen": datetime.utcnow().isoformat(),
-            "created_at": datetime.utcnow().isoformat(),
-            "nsfw_consent": False,
-        }
-        
-        result = await supabase.insert(self.TABLE_USERS, user_data)
-        user = UserInRoom(**result)
-        
-        # Update room last activity
-        await supabase.update(
-            self.TABLE_ROOMS,
-            {"last_activity_at": datetime.utcnow().isoformat()},
-            {"id": room.id}
-        )
-        
-        return user, room
+        # Verification, rejoin-by-device and the 2-user cap all run in one
+        # locked transaction, so concurrent joins can't both take the last seat
+        result = await supabase.rpc("join_room_atomic", {
+            "p_name": data.room_name,
+            "p_secret_hash": security_service.hash_secret(data.room_secret),
+            "p_device_id": data.device_id,
+            "p_nickname": data.nickname
+        })
+        if result.get("error"):
+            raise ValueError(result["error"])
+        
+        room = Room(**result["room"])
+        user = UserInRoom(**result["user"])
+        users = [UserInRoom(**u) for u in result["users"]]
+        self._forget_room(room.id)
+        
+        return user, self._to_public(room, users)
     
     async def get_room_users(self, room_id: int) -> list[UserInRoom]:
         """
@@ -209,11 +212,37 @@ class RoomService:
         Returns:
             RoomPublic or None
         """
-        room = await self.get_room(room_id)
-        if not room:
+        # One request: PostgREST embeds room_users via the foreign key (a JOIN)
+        result = await supabase.select(
+            self.TABLE_ROOMS,
+            columns=f"*,{self.TABLE_USERS}(*)",
+            filters={"id": room_id}
+        )
+        if not result:
             return None
         
-        users = await self.get_room_users(room_id)
+        row = result[0]
+        users = [UserInRoom(**u) for u in row.pop(self.TABLE_USERS, None) or []]
+        room = Room(**row)
+        self._remember_room(room)
+        
+        memo = request_scope()
+        if memo is not None:
+            memo[("room", room_id)] = room
+        return self._to_public(room, users)
+    
+    @staticmethod
+    def _to_public(room: Room, users: list[UserInRoom]) -> RoomPublic:
+        """
+        Build the public projection of a room from rows already in hand.
+        
+        Args:
+            room: Room record
+            users: Users in the room
+            
+        Returns:
+            RoomPublic
+        """
         user_publics = [
             UserPublic(
                 id=u.id,
@@ -251,7 +280,7 @@ class RoomService:
             self.TABLE_USERS,
             {
                 "is_online": is_online,
-                "last_seen": datetime.utcnow().isoformat()
+                "last_seen": _utcnow_iso()
             },
             {"id": user_id}
         )
@@ -273,57 +302,19 @@ class RoomService:
         Returns:
             Current consent status for the room
         """
-        # Get user to determine role
-        users = await self.get_room_users(room_id)
-        user = next((u for u in users if u.id == user_id), None)
-        
-        if not user:
-            raise ValueError("User not found in room")
-        
-        # Update user consent
-        await supabase.update(
-            self.TABLE_USERS,
-            {
-                "nsfw_consent": consent,
-                "nsfw_consent_at": datetime.utcnow().isoformat() if consent else None
-            },
-            {"id": user_id}
-        )
-        
-        # Update room consent field based on role
-        consent_field = (
-            "partner_a_nsfw_consent" if user.role == UserRole.PARTNER_A 
-            else "partner_b_nsfw_consent"
-        )
-        
-        await supabase.update(
-            self.TABLE_ROOMS,
-            {consent_field: consent},
-            {"id": room_id}
-        )
-        
-        # Get updated room
-        room = await self.get_room(room_id)
-        
-        # Check if both consented
+        # Consent, the partner flag and the derived mode in one transaction
+        result = await supabase.rpc("set_nsfw_consent", {
+            "p_room_id": room_id,
+            "p_user_id": user_id,
+            "p_consent": consent
+        })
+        self._forget_room(room_id)
+        if result.get("error"):
+            raise ValueError(result["error"])
+        
+        room = Room(**result["room"])
         both_consented = room.partner_a_nsfw_consent and room.partner_b_nsfw_consent
         
-        # Update NSFW mode if both consented
-        if both_consented and room.nsfw_mode != NSFWMode.ENABLED:
-            await supabase.update(
-                self.TABLE_ROOMS,
-                {"nsfw_mode": NSFWMode.ENABLED.value},
-                {"id": room_id}
-            )
-            room.nsfw_mode = NSFWMode.ENABLED
-        elif not both_consented and room.nsfw_mode == NSFWMode.ENABLED:
-            await supabase.update(
-                self.TABLE_ROOMS,
-                {"nsfw_mode": NSFWMode.DISABLED.value},
-                {"id": room_id}
-            )
-            room.nsfw_mode = NSFWMode.DISABLED
-        
         return ConsentStatus(
             room_id=room_id,
             nsfw_mode=room.nsfw_mode,
@@ -345,12 +336,13 @@ class RoomService:
             {"nsfw_mode": NSFWMode.PENDING_CONSENT.value},
             {"id": room_id}
         )
+        self._forget_room(room_id)
     
     async def update_room_settings(
         self,
         room_id: int,
         settings_data: RoomSettings
-    ) -> Room:
+    ) -> Optional[RoomPublic]:
         """
         Update room settings.
         
@@ -359,14 +351,19 @@ class RoomService:
             settings_data: Settings to update
             
         Returns:
-            Updated room
+            Updated RoomPublic, or None if the room does not exist
         """
-        update_data = settings_data.model_dump(exclude_none=True)
-        update_data["updated_at"] = datetime.utcnow().isoformat()
+        update_data = settings_data.model_dump(exclude_none=True, mode="json")
+        update_data["updated_at"] = _utcnow_iso()
         
-        await supabase.update(self.TABLE_ROOMS, update_data, {"id": room_id})
+        updated = await supabase.update(self.TABLE_ROOMS, update_data, {"id": room_id})
+        self._forget_room(room_id)
+        if not updated:
+            return None
         
-        return await self.get_room(room_id)
+        # The update returns the new row; only the users need fetching
+        users = await self.get_room_users(room_id)
+        return self._to_public(Room(**updated[0]), users)
     
     async def update_room_onboarding(
         self,
@@ -383,15 +380,15 @@ class RoomService:
         Returns:
             Updated room
         """
-        update_data = {
-            "relationship_type": onboarding.relationship_type,
-            "updated_at": datetime.utcnow().isoformat()
-        }
-        
-        if onboarding.anniversary_date:
-            update_data["anniversary_date"] = onboarding.anniversary_date.isoformat()
+        update_data = onboarding.model_dump(
+            include=self.ONBOARDING_COLUMNS,
+            exclude_none=True,
+            mode="json"
+        )
+        update_data["updated_at"] = _utcnow_iso()
         
         await supabase.update(self.TABLE_ROOMS, update_data, {"id": room_id})
+        self._forget_room(room_id)
         
         return await self.get_room(room_id)
     
@@ -410,10 +407,11 @@ class RoomService:
             self.TABLE_ROOMS,
             {
                 "status": RoomStatus.DELETED.value,
-                "updated_at": datetime.utcnow().isoformat()
+                "updated_at": _utcnow_iso()
             },
             {"id": room_id}
         )
+        self._forget_room(room_id)
         
         return True
     
@@ -430,8 +428,10 @@ class RoomService:
         # Delete users first
         await supabase.delete(self.TABLE_USERS, {"room_id": room_id})
         
-        # Delete room
+        # Delete room (messages go with it via ON DELETE CASCADE)
         await supabase.delete(self.TABLE_ROOMS, {"id": room_id})
+        self._forget_room(room_id)
+        message_service.forget_room_messages(room_id)
         
         return True
 
@@ -47,6 +47,9 @@ CREATE TABLE IF NOT EXISTS rooms (
 -- Index for active rooms lookup
 CREATE INDEX IF NOT EXISTS idx_rooms_status ON rooms(status);
 
+-- Index for join-by-name lookups
+CREATE INDEX IF NOT EXISTS idx_rooms_name ON rooms(name);
+
 -- ================================================
 -- ROOM USERS TABLE
 -- ================================================
@@ -77,6 +80,10 @@ CREATE TABLE IF NOT EXISTS room_users (
 CREATE INDEX IF NOT EXISTS idx_room_users_room ON room_users(room_id);
 CREATE INDEX IF NOT EXISTS idx_room_users_device ON room_users(device_id);
 
+-- One seat per role; with the role CHECK this caps a room at 2 users
+-- even for writes that bypass join_room_atomic
+CREATE UNIQUE INDEX IF NOT EXISTS room_users_room_role_uq ON room_users(room_id, role);
+
 -- ================================================
 -- MESSAGES TABLE
 -- ================================================
@@ -118,6 +125,9 @@ CREATE INDEX IF NOT EXISTS idx_messages_room ON messages(room_id);
 CREATE INDEX IF NOT EXISTS idx_messages_sender ON messages(sender_id);
 CREATE INDEX IF NOT EXISTS idx_messages_created ON messages(room_id, created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_messages_type ON messages(message_type);
+-- Covers the reply_to_id foreign key so deleting messages doesn't
+-- seq-scan for replies to null out
+CREATE INDEX IF NOT EXISTS idx_messages_reply_to ON messages(reply_to_id) WHERE reply_to_id IS NOT NULL;
 
 -- ================================================
 -- REACTIONS TABLE (denormalized for quick access)
@@ -299,6 +309,164 @@ CREATE TRIGGER trigger_sync_reactions
     FOR EACH ROW
     EXECUTE FUNCTION sync_message_reactions();
 
+-- Add a user to one reaction list in a single UPDATE (idempotent)
+CREATE OR REPLACE FUNCTION add_message_reaction(p_message_id UUID, p_reaction TEXT, p_user_id TEXT)
+RETURNS SETOF messages AS $$
+    UPDATE messages
+    SET reactions = CASE
+            WHEN COALESCE(reactions -> p_reaction, '[]'::jsonb) ? p_user_id THEN reactions
+            ELSE jsonb_set(
+                COALESCE(reactions, '{}'::jsonb),
+                ARRAY[p_reaction],
+                COALESCE(reactions -> p_reaction, '[]'::jsonb) || to_jsonb(p_user_id)
+            )
+        END,
+        updated_at = NOW()
+    WHERE id = p_message_id
+    RETURNING *;
+$$ LANGUAGE sql;
+
+-- Remove a user from one reaction list, dropping the key once it is empty
+CREATE OR REPLACE FUNCTION remove_message_reaction(p_message_id UUID, p_reaction TEXT, p_user_id TEXT)
+RETURNS SETOF messages AS $$
+    UPDATE messages
+    SET reactions = CASE
+            WHEN jsonb_array_length(COALESCE(reactions -> p_reaction, '[]'::jsonb) - p_user_id) = 0
+                THEN COALESCE(reactions, '{}'::jsonb) - p_reaction
+            ELSE jsonb_set(reactions, ARRAY[p_reaction], (reactions -> p_reaction) - p_user_id)
+        END,
+        updated_at = NOW()
+    WHERE id = p_message_id
+    RETURNING *;
+$$ LANGUAGE sql;
+
+-- Delete a room's messages, returning only their ids
+CREATE OR REPLACE FUNCTION delete_room_messages(p_room_id INTEGER)
+RETURNS SETOF UUID AS $$
+    DELETE FROM messages WHERE room_id = p_room_id RETURNING id;
+$$ LANGUAGE sql;
+
+-- Create a room and its first user in one transaction
+CREATE OR REPLACE FUNCTION create_room_atomic(
+    p_name TEXT,
+    p_secret_hash TEXT,
+    p_device_id TEXT,
+    p_nickname TEXT
+) RETURNS JSONB AS $$
+DECLARE
+    v_room rooms%ROWTYPE;
+    v_user room_users%ROWTYPE;
+BEGIN
+    INSERT INTO rooms (name, secret_hash, status, nsfw_mode, partner_a_nsfw_consent, partner_b_nsfw_consent)
+    VALUES (p_name, p_secret_hash, 'active', 'disabled', FALSE, FALSE)
+    RETURNING * INTO v_room;
+    
+    INSERT INTO room_users (room_id, nickname, device_id, role, is_online, last_seen, nsfw_consent)
+    VALUES (v_room.id, p_nickname, p_device_id, 'partner_a', TRUE, NOW(), FALSE)
+    RETURNING * INTO v_user;
+    
+    RETURN jsonb_build_object('room', to_jsonb(v_room), 'user', to_jsonb(v_user));
+END;
+$$ LANGUAGE plpgsql;
+
+-- Join a room by name: verify, rejoin by device or claim a free seat.
+-- The room row is locked so two joins cannot both take the last seat.
+CREATE OR REPLACE FUNCTION join_room_atomic(
+    p_name TEXT,
+    p_secret_hash TEXT,
+    p_device_id TEXT,
+    p_nickname TEXT
+) RETURNS JSONB AS $$
+DECLARE
+    v_room rooms%ROWTYPE;
+    v_user room_users%ROWTYPE;
+    v_count INTEGER;
+BEGIN
+    SELECT * INTO v_room FROM rooms WHERE name = p_name LIMIT 1 FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN jsonb_build_object('error', 'Room not found');
+    END IF;
+    IF v_room.status <> 'active' THEN
+        RETURN jsonb_build_object('error', 'Room is not active');
+    END IF;
+    IF v_room.secret_hash <> p_secret_hash THEN
+        RETURN jsonb_build_object('error', 'Invalid room secret');
+    END IF;
+    
+    -- Rejoin: a single index hit on UNIQUE(room_id, device_id)
+    UPDATE room_users SET is_online = TRUE, last_seen = NOW()
+    WHERE room_id = v_room.id AND device_id = p_device_id
+    RETURNING * INTO v_user;
+    
+    IF NOT FOUND THEN
+        SELECT count(*) INTO v_count FROM room_users WHERE room_id = v_room.id;
+        IF v_count >= 2 THEN
+            RETURN jsonb_build_object('error', 'Room is full (maximum 2 users)');
+        END IF;
+        
+        -- Take whichever role is free (room_users_room_role_uq)
+        INSERT INTO room_users (room_id, nickname, device_id, role, is_online, last_seen, nsfw_consent)
+        VALUES (
+            v_room.id, p_nickname, p_device_id,
+            CASE WHEN EXISTS (
+                SELECT 1 FROM room_users WHERE room_id = v_room.id AND role = 'partner_a'
+            ) THEN 'partner_b' ELSE 'partner_a' END,
+            TRUE, NOW(), FALSE
+        )
+        ON CONFLICT (room_id, device_id) DO UPDATE
+            SET is_online = TRUE, last_seen = NOW()
+        RETURNING * INTO v_user;
+        
+        UPDATE rooms SET last_activity_at = NOW() WHERE id = v_room.id RETURNING * INTO v_room;
+    END IF;
+    
+    RETURN jsonb_build_object(
+        'room', to_jsonb(v_room),
+        'user', to_jsonb(v_user),
+        'users', (
+            SELECT jsonb_agg(to_jsonb(u) ORDER BY u.created_at)
+            FROM room_users u WHERE u.room_id = v_room.id
+        )
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Record one partner's NSFW consent and derive the room's mode in one pass
+CREATE OR REPLACE FUNCTION set_nsfw_consent(
+    p_room_id INTEGER,
+    p_user_id UUID,
+    p_consent BOOLEAN
+) RETURNS JSONB AS $$
+DECLARE
+    v_role TEXT;
+    v_room rooms%ROWTYPE;
+BEGIN
+    UPDATE room_users
+    SET nsfw_consent = p_consent,
+        nsfw_consent_at = CASE WHEN p_consent THEN NOW() END
+    WHERE id = p_user_id AND room_id = p_room_id
+    RETURNING role INTO v_role;
+    IF NOT FOUND THEN
+        RETURN jsonb_build_object('error', 'User not found in room');
+    END IF;
+    
+    UPDATE rooms SET
+        partner_a_nsfw_consent = CASE WHEN v_role = 'partner_a' THEN p_consent ELSE partner_a_nsfw_consent END,
+        partner_b_nsfw_consent = CASE WHEN v_role = 'partner_b' THEN p_consent ELSE partner_b_nsfw_consent END,
+        nsfw_mode = CASE
+            WHEN (CASE WHEN v_role = 'partner_a' THEN p_consent ELSE partner_a_nsfw_consent END)
+             AND (CASE WHEN v_role = 'partner_b' THEN p_consent ELSE partner_b_nsfw_consent END)
+                THEN 'enabled'
+            WHEN nsfw_mode = 'enabled' THEN 'disabled'
+            ELSE nsfw_mode
+        END
+    WHERE id = p_room_id
+    RETURNING * INTO v_room;
+    
+    RETURN jsonb_build_object('room', to_jsonb(v_room));
+END;
+$$ LANGUAGE plpgsql;
+
 -- ================================================
 -- COMPLETED
 -- ================================================
@@ -3,16 +3,23 @@ WebSocket connection manager for real-time chat.
 Handles connection lifecycle, broadcasting, and room-based messaging.
 """
 
-import json
+import time
+import uuid
 import asyncio
+import logging
 from datetime import datetime
-from typing import Dict, Set, Optional, Any
+from collections import Counter
+from typing import AbstractSet, Callable, Dict, Set, Optional, Any, Tuple
 from fastapi import WebSocket, WebSocketDisconnect
 from pydantic import ValidationError
+import orjson
 
+from core.cache import cache
 from models.message import WebSocketMessage
 from models.user import UserSession
 
+logger = logging.getLogger(__name__)
+
 
 class ConnectionManager:
     """
@@ -20,9 +27,27 @@ class ConnectionManager:
     Supports room-based messaging and user presence tracking.
     """
     
+    LOCK_STRIPES = 32
+    TYPING_DEBOUNCE = 0.5  # seconds between repeated typing broadcasts
+    TYPING_TIMEOUT = 3.0  # seconds before a typing indicator clears itself
+    SEND_QUEUE_SIZE = 256  # frames buffered per connection before it is dropped
+    RELAY_CHANNEL = "ws:room:{}"  # Redis pub/sub channel per room
+    RELAY_RETRY_MIN = 0.5  # seconds before the first relay reconnect
+    RELAY_RETRY_MAX = 30.0  # cap for the exponential reconnect backoff
+    RELAY_QUEUE_SIZE = 10_000  # relay messages buffered for the publisher
+    RELAY_PUBLISH_BATCH = 256  # relay messages sent per Redis pipeline
+    RELAY_FRAME = "frame"  # relay message kinds
+    RELAY_CLOSE = "close"
+    RELAY_EVICT = "evict"
+    
     def __init__(self):
-        # room_id -> set of WebSocket connections
-        self._room_connections: Dict[int, Set[WebSocket]] = {}
+        # room_id -> {WebSocket: user_id}; the user id sits next to its
+        # connection so broadcasts don't consult _connection_sessions
+        self._room_connections: Dict[int, Dict[WebSocket, str]] = {}
+        
+        # room_id -> {user_id: open sockets}, kept in step with
+        # _room_connections so presence reads never walk the connections
+        self._room_users: Dict[int, Counter] = {}
         
         # WebSocket -> UserSession mapping
         self._connection_sessions: Dict[WebSocket, UserSession] = {}
@@ -33,8 +58,38 @@ class ConnectionManager:
         # room_id -> set of user_ids currently typing
         self._typing_users: Dict[int, Set[str]] = {}
         
-        # Lock for thread-safe operations
-        self._lock = asyncio.Lock()
+        # (room_id, user_id) -> monotonic time of the last typing broadcast
+        self._typing_last_sent: Dict[Tuple[int, str], float] = {}
+        
+        # (room_id, user_id) -> pending auto-off for a typing indicator
+        self._typing_timers: Dict[Tuple[int, str], asyncio.TimerHandle] = {}
+        
+        # WebSocket -> outgoing frames, drained by that socket's writer task,
+        # so a slow client never holds up a broadcast
+        self._send_queues: Dict[WebSocket, asyncio.Queue] = {}
+        self._writers: Dict[WebSocket, asyncio.Task] = {}
+        
+        # Striped per-room locks so unrelated rooms don't serialize on one
+        # lock; _user_connections is only touched by single dict operations
+        self._locks = [asyncio.Lock() for _ in range(self.LOCK_STRIPES)]
+        
+        # Background disconnects and typing expiries
+        self._background_tasks: Set[asyncio.Task] = set()
+        
+        # Redis relay so partners on different workers see each other's
+        # broadcasts; the id tags this worker's own publications
+        self._relay_id = uuid.uuid4().hex
+        self._relay_task: Optional[asyncio.Task] = None
+        # (channel, message) pairs drained by a single publisher task, so
+        # broadcasters never wait on a Redis round trip
+        self._publish_queue: Optional[asyncio.Queue] = None
+        self._publisher_task: Optional[asyncio.Task] = None
+        # topic -> callback dropping a room's entry from a per-worker cache
+        self._evict_handlers: Dict[str, Callable[[int], None]] = {}
+    
+    def _room_lock(self, room_id: int) -> asyncio.Lock:
+        """Get the lock guarding a room's connection state."""
+        return self._locks[room_id % self.LOCK_STRIPES]
     
     async def connect(
         self,
@@ -64,11 +119,10 @@ class ConnectionManager:
             connected_at=datetime.utcnow()
         )
         
-        async with self._lock:
+        async with self._room_lock(room_id):
             # Add to room connections
-            if room_id not in self._room_connections:
-                self._room_connections[room_id] = set()
-            self._room_connections[room_id].add(websocket)
+            self._room_connections.setdefault(room_id, {})[websocket] = user_id
+            self._room_users.setdefault(room_id, Counter())[user_id] += 1
             
             # Store session mapping
             self._connection_sessions[websocket] = session
@@ -76,18 +130,19 @@ class ConnectionManager:
             # Store user connection (overwrite if reconnecting)
             self._user_connections[user_id] = websocket
             
+            queue: asyncio.Queue = asyncio.Queue(maxsize=self.SEND_QUEUE_SIZE)
+            self._send_queues[websocket] = queue
+            self._writers[websocket] = asyncio.create_task(self._writer(websocket, queue))
+            
             # Initialize typing set for room if needed
             if room_id not in self._typing_users:
                 self._typing_users[room_id] = set()
         
         # Broadcast user joined event
-        await self.broadcast_to_room(
+        await self.broadcast_event(
             room_id,
-            WebSocketMessage(
-                event="user_joined",
-                data={"user_id": user_id},
-                room_id=room_id
-            ),
+            "user_joined",
+            {"user_id": user_id},
             exclude_user=user_id
         )
         
@@ -103,38 +158,43 @@ class ConnectionManager:
         Returns:
             The disconnected UserSession or None
         """
-        async with self._lock:
-            session = self._connection_sessions.pop(websocket, None)
+        session = self._connection_sessions.get(websocket)
+        if session is None:
+            return None
+        room_id = session.room_id
+        user_id = session.user_id
+        
+        async with self._room_lock(room_id):
+            if self._connection_sessions.pop(websocket, None) is None:
+                # Already disconnected while waiting for the lock
+                return None
             
-            if session:
-                room_id = session.room_id
-                user_id = session.user_id
-                
-                # Remove from room connections
-                if room_id in self._room_connections:
-                    self._room_connections[room_id].discard(websocket)
-                    if not self._room_connections[room_id]:
-                        del self._room_connections[room_id]
-                
-                # Remove from user connections
-                if self._user_connections.get(user_id) == websocket:
-                    del self._user_connections[user_id]
-                
-                # Remove from typing users
-                if room_id in self._typing_users:
-                    self._typing_users[room_id].discard(user_id)
+            # Remove from room connections
+            if room_id in self._room_connections:
+                self._room_connections[room_id].pop(websocket, None)
+                if not self._room_connections[room_id]:
+                    del self._room_connections[room_id]
+            self._release_user(room_id, user_id)
+            
+            # Remove from user connections
+            if self._user_connections.get(user_id) == websocket:
+                del self._user_connections[user_id]
+            
+            self._stop_writer(websocket)
+            
+            # Remove from typing users
+            if room_id in self._typing_users:
+                self._typing_users[room_id].discard(user_id)
+            self._clear_typing_timer(room_id, user_id)
+            self._typing_last_sent.pop((room_id, user_id), None)
         
         # Broadcast user left event (outside lock to avoid deadlock)
-        if session:
-            await self.broadcast_to_room(
-                session.room_id,
-                WebSocketMessage(
-                    event="user_left",
-                    data={"user_id": session.user_id},
-                    room_id=session.room_id
-                ),
-                exclude_user=session.user_id
-            )
+        await self.broadcast_event(
+            room_id,
+            "user_left",
+            {"user_id": user_id},
+            exclude_user=user_id
+        )
         
         return session
     
@@ -153,24 +213,294 @@ class ConnectionManager:
             exclude_user: Optional user_id to exclude from broadcast
             
         Returns:
-            Number of connections that received the message
+            Number of connections the message was queued for
+        """
+        # Encoded once with orjson; every recipient gets the same bytes
+        frame = orjson.dumps(message.model_dump())
+        return await self.broadcast_prepared(room_id, frame, exclude_user)
+    
+    async def broadcast_prepared(
+        self,
+        room_id: int,
+        frame: bytes,
+        exclude_user: Optional[str] = None
+    ) -> int:
+        """
+        Broadcast an already-encoded frame to all connections in a room.
+        
+        Args:
+            room_id: Target room
+            frame: JSON-encoded event bytes, shared by every recipient
+            exclude_user: Optional user_id to exclude from broadcast
+            
+        Returns:
+            Number of local connections the frame was queued for
         """
-        connections = self._room_connections.get(room_id, set()).copy()
-        sent_count = 0
+        sent = self._fanout(room_id, frame, exclude_user)
+        # Sockets on other workers are reached through their relay
+        self._publish(room_id, self.RELAY_FRAME, exclude_user or "", frame)
+        return sent
+    
+    def on_evict(self, topic: str, handler: Callable[[int], None]) -> None:
+        """
+        Register a callback for cache evictions published by other workers.
         
-        message_json = message.model_dump_json()
+        Args:
+            topic: Name shared with publish_evict, e.g. "room"
+            handler: Called with the room id; must not block
+        """
+        self._evict_handlers[topic] = handler
+    
+    def publish_evict(self, topic: str, room_id: int) -> None:
+        """
+        Tell the other workers to drop a room's entry from a cache.
         
-        for websocket in connections:
-            session = self._connection_sessions.get(websocket)
-            if session and (exclude_user is None or session.user_id != exclude_user):
+        Args:
+            topic: Topic the workers' handlers are registered under
+            room_id: Room whose cached state went stale
+        """
+        self._publish(room_id, self.RELAY_EVICT, "", topic.encode())
+    
+    def _publish(self, room_id: int, kind: str, exclude_user: str, payload: bytes) -> None:
+        """
+        Queue a relay message for the other workers, if the relay is running.
+        
+        The message is a JSON header line ([origin, kind, exclude_user])
+        followed by the raw payload; JSON escapes newlines inside strings,
+        so the first newline always ends the header.
+        
+        Args:
+            room_id: Room the message concerns
+            kind: RELAY_FRAME, RELAY_CLOSE or RELAY_EVICT
+            exclude_user: User to skip on delivery, or ""
+            payload: Encoded frame, close reason or eviction topic
+        """
+        if self._publish_queue is None:
+            return
+        header = orjson.dumps([self._relay_id, kind, exclude_user])
+        try:
+            self._publish_queue.put_nowait(
+                (self.RELAY_CHANNEL.format(room_id), header + b"\n" + payload)
+            )
+        except asyncio.QueueFull:
+            logger.warning("WebSocket relay queue full, dropping %s for room %s", kind, room_id)
+    
+    async def _publisher(self, queue: asyncio.Queue) -> None:
+        """Publish queued relay messages, pipelining whatever has piled up."""
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.RELAY_PUBLISH_BATCH and not queue.empty():
+                batch.append(queue.get_nowait())
+            
+            try:
+                async with cache.client.pipeline(transaction=False) as pipe:
+                    for channel, message in batch:
+                        pipe.publish(channel, message)
+                    await pipe.execute()
+            except Exception as e:
+                logger.warning("WebSocket relay publish failed, dropped %d messages: %s", len(batch), e)
+    
+    def _fanout(
+        self,
+        room_id: int,
+        frame: bytes,
+        exclude_user: Optional[str] = None
+    ) -> int:
+        """
+        Queue a frame for this worker's connections in a room.
+        
+        Args:
+            room_id: Target room
+            frame: Encoded frame
+            exclude_user: Optional user_id to skip
+            
+        Returns:
+            Number of connections the frame was queued for
+        """
+        sent = 0
+        overflowed = []
+        for websocket, user_id in self._room_connections.get(room_id, {}).items():
+            if user_id == exclude_user:
+                continue
+            if self._enqueue(websocket, frame):
+                sent += 1
+            else:
+                overflowed.append(websocket)
+        
+        if overflowed:
+            self._reap(overflowed)
+        return sent
+    
+    async def start_relay(self) -> None:
+        """Relay room broadcasts between workers through Redis pub/sub."""
+        if not cache.is_connected or self._relay_task is not None:
+            return
+        self._relay_task = asyncio.create_task(self._relay())
+        self._publish_queue = asyncio.Queue(maxsize=self.RELAY_QUEUE_SIZE)
+        self._publisher_task = asyncio.create_task(self._publisher(self._publish_queue))
+    
+    async def stop_relay(self) -> None:
+        """Stop relaying broadcasts to and from other workers."""
+        tasks = [task for task in (self._relay_task, self._publisher_task) if task is not None]
+        self._relay_task = self._publisher_task = self._publish_queue = None
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    
+    async def _relay(self) -> None:
+        """
+        Deliver frames published by other workers to local sockets.
+        
+        Resubscribes with exponential backoff whenever the Redis
+        connection drops, until stop_relay cancels it.
+        """
+        delay = self.RELAY_RETRY_MIN
+        while True:
+            # One pattern subscription per worker; frames for rooms without
+            # local sockets are dropped with a dict lookup
+            pubsub = cache.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(self.RELAY_CHANNEL.format("*"))
+                logger.info("WebSocket relay subscribed")
+                delay = self.RELAY_RETRY_MIN
+                
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    header, payload = message["data"].split(b"\n", 1)
+                    origin, kind, exclude_user = orjson.loads(header)
+                    if origin == self._relay_id:
+                        continue
+                    room_id = int(message["channel"].rsplit(b":", 1)[1])
+                    if kind == self.RELAY_EVICT:
+                        # Caches hold rooms with no local sockets too
+                        handler = self._evict_handlers.get(payload.decode())
+                        if handler is not None:
+                            handler(room_id)
+                        continue
+                    if room_id not in self._room_connections:
+                        continue
+                    if kind == self.RELAY_CLOSE:
+                        self._spawn(self._close_local(room_id, payload.decode()))
+                    else:
+                        self._fanout(room_id, payload, exclude_user or None)
+                
+                logger.warning("WebSocket relay subscription ended, resubscribing in %.1fs", delay)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("WebSocket relay lost (%s), reconnecting in %.1fs", e, delay)
+            finally:
                 try:
-                    await websocket.send_text(message_json)
-                    sent_count += 1
+                    await pubsub.aclose()
                 except Exception:
-                    # Connection might be closed, will be cleaned up
                     pass
+            
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.RELAY_RETRY_MAX)
+    
+    def _enqueue(self, websocket: WebSocket, frame: bytes) -> bool:
+        """
+        Queue a frame for a connection's writer without waiting.
         
-        return sent_count
+        Args:
+            websocket: Target connection
+            frame: Encoded frame
+            
+        Returns:
+            False if the connection is gone or its queue is full
+        """
+        queue = self._send_queues.get(websocket)
+        if queue is None:
+            return False
+        try:
+            queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            return False
+    
+    async def _writer(self, websocket: WebSocket, queue: asyncio.Queue) -> None:
+        """Send queued frames to one connection until it fails or is stopped."""
+        try:
+            while True:
+                frame = await queue.get()
+                await websocket.send_bytes(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._reap([websocket])
+    
+    def _stop_writer(self, websocket: WebSocket) -> None:
+        """Drop a connection's send queue and cancel its writer."""
+        self._send_queues.pop(websocket, None)
+        writer = self._writers.pop(websocket, None)
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
+    
+    def _spawn(self, coro) -> None:
+        """Run a coroutine in the background, keeping a reference until done."""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
+    def _reap(self, websockets: list[WebSocket]) -> None:
+        """Disconnect and close sockets that failed or fell behind, in the background."""
+        async def run():
+            for websocket in websockets:
+                await self.disconnect(websocket)
+                try:
+                    await websocket.close(code=1013, reason="Connection too slow")
+                except Exception:
+                    pass
+        
+        self._spawn(run())
+    
+    async def broadcast_event(
+        self,
+        room_id: int,
+        event: str,
+        data: Dict[str, Any],
+        sender_id: Optional[str] = None,
+        exclude_user: Optional[str] = None
+    ) -> int:
+        """
+        Encode an event once and broadcast it to a room.
+        
+        Produces the same JSON shape as WebSocketMessage without building
+        a Pydantic model.
+        
+        Args:
+            room_id: Target room
+            event: Event type
+            data: Event payload
+            sender_id: User who triggered the event
+            exclude_user: Optional user_id to exclude from broadcast
+            
+        Returns:
+            Number of connections the event was queued for
+        """
+        frame = self._encode_event(room_id, event, data, sender_id)
+        return await self.broadcast_prepared(room_id, frame, exclude_user)
+    
+    @staticmethod
+    def _encode_event(
+        room_id: int,
+        event: str,
+        data: Dict[str, Any],
+        sender_id: Optional[str] = None
+    ) -> bytes:
+        """Encode an internally built event in the WebSocketMessage JSON shape."""
+        return orjson.dumps({
+            "event": event,
+            "data": data,
+            "room_id": room_id,
+            "sender_id": sender_id,
+            "timestamp": datetime.utcnow(),
+        })
     
     async def send_to_user(
         self,
@@ -185,15 +515,14 @@ class ConnectionManager:
             message: Message to send
             
         Returns:
-            True if message was sent successfully
+            True if message was queued for the user's connection
         """
         websocket = self._user_connections.get(user_id)
-        if websocket:
-            try:
-                await websocket.send_text(message.model_dump_json())
-                return True
-            except Exception:
-                pass
+        if websocket is None:
+            return False
+        if self._enqueue(websocket, orjson.dumps(message.model_dump())):
+            return True
+        self._reap([websocket])
         return False
     
     async def set_typing(self, room_id: int, user_id: str, is_typing: bool) -> None:
@@ -205,31 +534,59 @@ class ConnectionManager:
             user_id: User who is typing
             is_typing: Whether user is currently typing
         """
-        async with self._lock:
-            if room_id not in self._typing_users:
-                self._typing_users[room_id] = set()
+        key = (room_id, user_id)
+        now = time.monotonic()
+        
+        async with self._room_lock(room_id):
+            typing = self._typing_users.setdefault(room_id, set())
+            changed = (user_id in typing) != is_typing
             
             if is_typing:
-                self._typing_users[room_id].add(user_id)
+                typing.add(user_id)
             else:
-                self._typing_users[room_id].discard(user_id)
+                typing.discard(user_id)
+            
+            # Every keystroke pushes the auto-off back
+            self._clear_typing_timer(room_id, user_id)
+            if is_typing:
+                self._typing_timers[key] = asyncio.get_running_loop().call_later(
+                    self.TYPING_TIMEOUT, self._typing_expired, room_id, user_id
+                )
+            
+            # Clients send one event per keystroke; only re-broadcast an
+            # unchanged state once the debounce interval has passed
+            if not changed and now - self._typing_last_sent.get(key, 0.0) < self.TYPING_DEBOUNCE:
+                return
+            if is_typing:
+                self._typing_last_sent[key] = now
+            else:
+                self._typing_last_sent.pop(key, None)
+            typing_users = list(typing)
         
         # Broadcast typing status
-        await self.broadcast_to_room(
+        await self.broadcast_event(
             room_id,
-            WebSocketMessage(
-                event="typing_status",
-                data={
-                    "user_id": user_id,
-                    "is_typing": is_typing,
-                    "typing_users": list(self._typing_users.get(room_id, set()))
-                },
-                room_id=room_id
-            ),
+            "typing_status",
+            {
+                "user_id": user_id,
+                "is_typing": is_typing,
+                "typing_users": typing_users
+            },
             exclude_user=user_id
         )
     
-    def get_room_users(self, room_id: int) -> Set[str]:
+    def _clear_typing_timer(self, room_id: int, user_id: str) -> None:
+        """Cancel a pending typing auto-off."""
+        timer = self._typing_timers.pop((room_id, user_id), None)
+        if timer is not None:
+            timer.cancel()
+    
+    def _typing_expired(self, room_id: int, user_id: str) -> None:
+        """Clear a typing indicator that was not refreshed in time."""
+        self._typing_timers.pop((room_id, user_id), None)
+        self._spawn(self.set_typing(room_id, user_id, False))
+    
+    def get_room_users(self, room_id: int) -> AbstractSet[str]:
         """
         Get all user IDs currently connected to a room.
         
@@ -237,15 +594,10 @@ class ConnectionManager:
             room_id: Target room
             
         Returns:
-            Set of user IDs
+            Read-only live view of the user IDs
         """
-        connections = self._room_connections.get(room_id, set())
-        users = set()
-        for websocket in connections:
-            session = self._connection_sessions.get(websocket)
-            if session:
-                users.add(session.user_id)
-        return users
+        users = self._room_users.get(room_id)
+        return users.keys() if users is not None else frozenset()
     
     def get_room_count(self, room_id: int) -> int:
         """
@@ -257,7 +609,7 @@ class ConnectionManager:
         Returns:
             Number of active connections
         """
-        return len(self._room_connections.get(room_id, set()))
+        return len(self._room_connections.get(room_id, {}))
     
     def is_user_online(self, user_id: str) -> bool:
         """
@@ -285,30 +637,72 @@ class ConnectionManager:
     
     async def close_room_connections(self, room_id: int, reason: str = "Room closed") -> None:
         """
-        Close all connections in a room.
+        Close all connections in a room, on every worker.
         
         Args:
             room_id: Room to close
             reason: Closure reason to send to clients
         """
-        connections = self._room_connections.get(room_id, set()).copy()
+        self._publish(room_id, self.RELAY_CLOSE, "", reason.encode())
+        await self._close_local(room_id, reason)
+    
+    async def _close_local(self, room_id: int, reason: str) -> None:
+        """
+        Close this worker's connections in a room.
         
-        # Notify all users
-        close_message = WebSocketMessage(
-            event="room_closed",
-            data={"reason": reason},
-            room_id=room_id
-        )
+        Args:
+            room_id: Room to close
+            reason: Closure reason to send to clients
+        """
+        connections = list(self._room_connections.get(room_id, {}))
+        if not connections:
+            return
         
+        # Pending frames are moot once the room is closed
         for websocket in connections:
-            try:
-                await websocket.send_text(close_message.model_dump_json())
-                await websocket.close(code=1000, reason=reason)
-            except Exception:
-                pass
+            self._stop_writer(websocket)
+        
+        # Notify all users, then close, each across the room at once
+        close_frame = self._encode_event(room_id, "room_closed", {"reason": reason})
+        await asyncio.gather(
+            *(websocket.send_bytes(close_frame) for websocket in connections),
+            return_exceptions=True
+        )
+        await asyncio.gather(
+            *(websocket.close(code=1000, reason=reason) for websocket in connections),
+            return_exceptions=True
+        )
+        
+        # Everyone is leaving: clean up in one pass instead of a disconnect
+        # (and a user_left broadcast) per socket
+        async with self._room_lock(room_id):
+            room = self._room_connections.get(room_id, {})
+            for websocket in connections:
+                room.pop(websocket, None)
+                session = self._connection_sessions.pop(websocket, None)
+                if session is None:
+                    continue
+                self._release_user(room_id, session.user_id)
+                if self._user_connections.get(session.user_id) == websocket:
+                    del self._user_connections[session.user_id]
+                self._typing_users.get(room_id, set()).discard(session.user_id)
+                self._clear_typing_timer(room_id, session.user_id)
+                self._typing_last_sent.pop((room_id, session.user_id), None)
             
-            await self.disconnect(websocket)
-
+            if not room:
+                self._room_connections.pop(room_id, None)
+                self._typing_users.pop(room_id, None)
+    
+    def _release_user(self, room_id: int, user_id: str) -> None:
+        """Count one of a user's sockets out of a room's presence."""
+        users = self._room_users.get(room_id)
+        if users is None:
+            return
+        users[user_id] -= 1
+        if users[user_id] <= 0:
+            del users[user_id]
+            if not users:
+                del self._room_users[room_id]
 
 # Singleton instance
 connection_manager = ConnectionManager()
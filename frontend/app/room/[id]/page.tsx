@@ -56,6 +56,8 @@ export default function RoomPage() {
   const [room, setRoom] = useState<Room | null>(null);
   const [isConnected, setIsConnected] = useState(false);
   const [isTyping, setIsTyping] = useState<string[]>([]);
+  // Bot replies still streaming in, keyed by stream_id
+  const [streamingReplies, setStreamingReplies] = useState<Record<string, string>>({});
   const [showReactions, setShowReactions] = useState<string | null>(null);
   const [showSettings, setShowSettings] = useState(false);
   const [consentStatus, setConsentStatus] = useState<ConsentStatus | null>(null);
@@ -81,7 +83,7 @@ export default function RoomPage() {
 
   useEffect(() => {
     scrollToBottom();
-  }, [messages]);
+  }, [messages, streamingReplies]);
 
   // Load consent status
   const loadConsentStatus = async () => {
@@ -163,6 +165,9 @@ export default function RoomPage() {
     const wsUrl = `${process.env.NEXT_PUBLIC_WS_URL || 'ws://localhost:8000'}/api/chat/ws/${roomId}/${userId}?device_id=${deviceId}`;
     
     const ws = new WebSocket(wsUrl);
+    // Server sends pre-encoded JSON events as binary frames
+    ws.binaryType = 'arraybuffer';
+    const decoder = new TextDecoder();
     wsRef.current = ws;
 
     ws.onopen = () => {
@@ -171,11 +176,33 @@ export default function RoomPage() {
     };
 
     ws.onmessage = (event) => {
-      const data = JSON.parse(event.data);
+      const data = JSON.parse(
+        typeof event.data === 'string' ? event.data : decoder.decode(event.data)
+      );
       
       switch (data.event) {
         case 'new_message':
           setMessages(prev => [...prev, data.data]);
+          if (data.data.stream_id) {
+            // Final bot message replaces its streamed preview
+            setStreamingReplies(prev => {
+              const { [data.data.stream_id]: _done, ...rest } = prev;
+              return rest;
+            });
+          }
+          break;
+        case 'bot_token':
+          setStreamingReplies(prev => ({
+            ...prev,
+            [data.data.stream_id]: (prev[data.data.stream_id] || '') + data.data.token,
+          }));
+          break;
+        case 'bot_error':
+          // The reply failed mid-stream; drop its partial preview
+          setStreamingReplies(prev => {
+            const { [data.data.stream_id]: _failed, ...rest } = prev;
+            return rest;
+          });
           break;
         case 'typing_status':
           setIsTyping(data.data.typing_users.filter((id: string) => id !== userId));
@@ -359,6 +386,31 @@ export default function RoomPage() {
             />
           ))}
           
+          {/* Bot replies still streaming */}
+          {Object.entries(streamingReplies).map(([streamId, content]) => (
+            <ChatBubble
+              key={streamId}
+              message={{
+                id: streamId,
+                room_id: parseInt(roomId),
+                sender_id: 'bot',
+                content,
+                message_type: 'bot',
+                view_once: false,
+                view_once_available: false,
+                reactions: {},
+                is_remembered: false,
+                created_at: new Date().toISOString(),
+              }}
+              isOwn={false}
+              onLongPress={() => {}}
+              onRemember={() => {}}
+              showReactionBar={false}
+              onReaction={() => {}}
+              onCloseReactions={() => {}}
+            />
+          ))}
+          
           {/* Typing indicator */}
           {isTyping.length > 0 && (
             <div className="flex items-center space-x-3 px-4 py-2">